@@ -0,0 +1,121 @@
+import collections
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from task_store import write_json_atomic
+
+'''
+AI时长估计缓存
+同样的任务名（“洗衣服”、“做饭”……）会反复出现，AI每次给出的时长也基本相同。
+这里按规范化后的任务名缓存时长：
+- 命中时直接返回，不再调用模型、不消耗token
+- 条目有有效期（TTL），超过数量上限时淘汰最久未使用的条目（LRU）
+- 缓存保存在任务文件旁边的JSON文件中，修改后延迟合并写盘，重启后仍然有效
+'''
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_title(title):
+    """规范化任务名：全半角统一、转小写、去掉空白和标点"""
+    title = unicodedata.normalize('NFKC', str(title)).lower()
+    return re.sub(r'[\W_]+', '', title)
+
+
+class EstimateCache:
+    """任务名 -> AI估计时长（分钟）的持久化LRU缓存"""
+
+    def __init__(self, path, max_entries=500, ttl=30 * 24 * 3600, flush_delay=2.0):
+        self.path = path
+        self.max_entries = max_entries
+        # 条目有效期（秒）
+        self.ttl = ttl
+        self.flush_delay = flush_delay
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_timer = None
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        """从磁盘加载缓存，丢弃已过期的条目"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except Exception as e:
+            logger.error(f"加载AI估计缓存失败: {str(e)}", exc_info=True)
+            return
+        now = time.time()
+        with self._lock:
+            # 文件中按最近使用顺序保存，最后的是最近使用的
+            for entry in entries:
+                try:
+                    key, duration, stored_at = entry
+                    expired = now - stored_at >= self.ttl
+                except (TypeError, ValueError):
+                    logger.warning(f"AI估计缓存 {self.path} 中的条目格式错误，已忽略: {entry!r}")
+                    continue
+                if not expired:
+                    self._entries[key] = (duration, stored_at)
+        logger.info(f"已加载 {len(self._entries)} 条AI估计缓存")
+
+    def get(self, title):
+        """查询缓存，未命中或已过期时返回None"""
+        key = normalize_title(title)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] >= self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, title, duration):
+        """写入缓存，只缓存有效的时长"""
+        key = normalize_title(title)
+        if not key or not duration:
+            return
+        with self._lock:
+            self._entries[key] = (duration, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        """延迟写盘，短时间内的多次写入只写一次（调用方持有锁）"""
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._flush_timer = None
+            entries = [[key, duration, stored_at] for key, (duration, stored_at) in self._entries.items()]
+        try:
+            write_json_atomic(self.path, entries)
+        except Exception as e:
+            logger.error(f"保存AI估计缓存失败: {str(e)}", exc_info=True)
+
+    def stats(self):
+        """命中/未命中计数"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0
+        }
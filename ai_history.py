@@ -0,0 +1,224 @@
+import collections
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from ai_cache import normalize_title
+
+'''
+任务完成历史
+每完成一个任务追加一条记录（任务名、用户设置时长、AI估计时长、实际用时、完成时间）到 JSONL 文件，
+同时在内存中维护按相似任务名聚类的统计，用来生成AI提示词中的“历史任务聚类图”（history_map）：
+- 任务名用字符 1-gram/2-gram 的哈希向量表示，和已有聚类中心的余弦相似度超过阈值就归入该类
+- 启动时一次性聚类并用 NumPy 汇总各类的计划/实际用时，之后每条新记录只更新它所在的类
+- 生成 history_map 不需要扫描完整历史
+'''
+
+logger = logging.getLogger(__name__)
+
+# 任务名向量的维度（字符 n-gram 哈希到这么多个桶）
+VECTOR_DIM = 512
+
+
+def title_grams(title):
+    """规范化任务名的字符 1-gram 和 2-gram"""
+    text = normalize_title(title)
+    return list(text) + [text[i:i + 2] for i in range(len(text) - 1)]
+
+
+def title_vector(title, dim=VECTOR_DIM):
+    """任务名的L2归一化 n-gram 哈希向量，空任务名返回零向量"""
+    vector = np.zeros(dim, dtype=np.float32)
+    for gram in title_grams(title):
+        # crc32 在不同进程间稳定，内置 hash() 不是
+        vector[zlib.crc32(gram.encode('utf-8')) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def actual_minutes(task, time_remaining):
+    """根据用户设置时长和剩余时间计算实际用时（分钟），计时从未开始时返回None"""
+    duration = task.get('duration') or 0
+    if duration <= 0 or time_remaining >= duration:
+        return None
+    return round(duration - max(0, time_remaining), 2)
+
+
+class TaskHistory:
+    """追加写入的完成历史，以及增量维护的相似任务聚类统计"""
+
+    def __init__(self, path, legacy_path=None, cluster_threshold=0.4, top_clusters=5):
+        self.path = path
+        # 旧版的 AIHistory.json（JSON数组），第一次启动时导入
+        self.legacy_path = legacy_path
+        # 归入已有聚类所需的最小余弦相似度
+        self.cluster_threshold = cluster_threshold
+        # history_map 中最多列出的聚类数
+        self.top_clusters = top_clusters
+        self._lock = threading.Lock()
+        self._file = None
+        self._reset()
+
+    def _reset(self):
+        self.records = []
+        # 聚类：向量和（未归一化）、归一化中心、记录数、计划/实际用时之和、有实际用时的记录数、任务名计数
+        self._centroid_sums = np.zeros((0, VECTOR_DIM), dtype=np.float32)
+        self._centroids = np.zeros((0, VECTOR_DIM), dtype=np.float32)
+        self._counts = np.zeros(0)
+        self._planned_sums = np.zeros(0)
+        self._actual_sums = np.zeros(0)
+        self._actual_counts = np.zeros(0)
+        self._titles = []
+        # 每个聚类预先生成的摘要文本
+        self._summaries = []
+
+    # ============ 加载 ============
+
+    def load(self):
+        """读取历史记录并一次性完成聚类和汇总"""
+        records = self._read_records()
+        if records is None:
+            records = self._import_legacy()
+        with self._lock:
+            self._reset()
+            self.records = records
+            labels = np.array([self._assign(title_vector(r['title'])) for r in records], dtype=np.int64)
+            clusters = len(self._titles)
+            planned = np.array([r.get('duration') or 0 for r in records], dtype=np.float64)
+            actual = np.array([np.nan if r.get('actual_time') is None else r['actual_time'] for r in records],
+                              dtype=np.float64)
+            has_actual = ~np.isnan(actual)
+            # 向量化汇总每个聚类的记录数和用时
+            self._counts = np.bincount(labels, minlength=clusters).astype(np.float64)
+            self._planned_sums = np.bincount(labels, weights=planned, minlength=clusters)
+            self._actual_sums = np.bincount(labels[has_actual], weights=actual[has_actual], minlength=clusters)
+            self._actual_counts = np.bincount(labels[has_actual], minlength=clusters).astype(np.float64)
+            for record, label in zip(records, labels):
+                self._titles[label][record['title']] += 1
+            self._summaries = [self._summarize(i) for i in range(clusters)]
+        logger.info(f"已加载 {len(records)} 条任务完成历史，共 {len(self._titles)} 个相似任务聚类")
+
+    def _read_records(self):
+        if not os.path.exists(self.path):
+            return None
+        records = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # 崩溃时最后一行可能只写了一半，直接丢弃
+                    logger.warning(f"历史记录 {self.path} 第 {line_no} 行不完整，已忽略")
+        return records
+
+    def _import_legacy(self):
+        """第一次启动时把旧的 AIHistory.json 转成 JSONL"""
+        records = []
+        if self.legacy_path and os.path.exists(self.legacy_path):
+            try:
+                with open(self.legacy_path, 'r', encoding='utf-8') as f:
+                    legacy = json.load(f)
+                records = [r for r in legacy if isinstance(r, dict) and r.get('title')]
+            except Exception as e:
+                logger.error(f"读取旧的历史文件失败: {str(e)}", exc_info=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        if records:
+            logger.info(f"已从 {self.legacy_path} 导入 {len(records)} 条历史记录")
+        return records
+
+    # ============ 聚类 ============
+
+    def _assign(self, vector):
+        """把任务名向量归入最相似的聚类，没有足够相似的就新建一个，返回聚类编号（调用方持有锁）"""
+        if len(self._centroids):
+            similarities = self._centroids @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.cluster_threshold:
+                self._centroid_sums[best] += vector
+                self._centroids[best] = self._centroid_sums[best] / np.linalg.norm(self._centroid_sums[best])
+                return best
+        self._centroid_sums = np.vstack([self._centroid_sums, vector])
+        self._centroids = np.vstack([self._centroids, vector])
+        for name in ('_counts', '_planned_sums', '_actual_sums', '_actual_counts'):
+            setattr(self, name, np.append(getattr(self, name), 0.0))
+        self._titles.append(collections.Counter())
+        self._summaries.append('')
+        return len(self._titles) - 1
+
+    def _find(self, vector):
+        """查找任务名所属的聚类（不修改），没有时返回None"""
+        if not len(self._centroids):
+            return None
+        similarities = self._centroids @ vector
+        best = int(np.argmax(similarities))
+        return best if similarities[best] >= self.cluster_threshold else None
+
+    def _summarize(self, cluster):
+        titles = self._titles[cluster]
+        name = titles.most_common(1)[0][0]
+        if len(titles) > 1:
+            name += f"等{len(titles)}种"
+        count = int(self._counts[cluster])
+        planned = self._planned_sums[cluster] / count
+        summary = f"{name}（完成{count}次）：计划平均{planned:.0f}分钟"
+        if self._actual_counts[cluster]:
+            actual = self._actual_sums[cluster] / self._actual_counts[cluster]
+            summary += f"，实际平均{actual:.0f}分钟"
+        else:
+            summary += "，实际用时未记录"
+        return summary
+
+    # ============ 读写 ============
+
+    def record(self, task, actual_time):
+        """追加一条完成记录，并只更新它所在的聚类"""
+        record = {
+            'title': task['title'],
+            'duration': task.get('duration', 0),
+            'ai_duration': task.get('ai_duration', 0),
+            'actual_time': actual_time,
+            'completed_at': time.time()
+        }
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+            self.records.append(record)
+
+            cluster = self._assign(title_vector(record['title']))
+            self._counts[cluster] += 1
+            self._planned_sums[cluster] += record['duration'] or 0
+            if actual_time is not None:
+                self._actual_sums[cluster] += actual_time
+                self._actual_counts[cluster] += 1
+            self._titles[cluster][record['title']] += 1
+            self._summaries[cluster] = self._summarize(cluster)
+        return record
+
+    def history_map(self, title):
+        """生成提示词中的历史任务聚类图：同类任务排在最前，其余按完成次数排列"""
+        with self._lock:
+            if not self._summaries:
+                return "暂无"
+            own = self._find(title_vector(title))
+            order = [int(i) for i in np.argsort(-self._counts, kind='stable') if i != own]
+            if own is not None:
+                order.insert(0, own)
+            return '；'.join(self._summaries[i] for i in order[:self.top_clusters])
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,131 @@
+import collections
+import logging
+import queue
+import threading
+import time
+
+'''
+AI后台任务队列
+添加/完成任务时的AI调用不再阻塞请求，而是放进一个有界队列，由固定数量的工作线程处理：
+- 队列满时 submit 直接返回False（背压），调用方决定如何降级
+- 记录排队长度、等待时间、执行时间和失败次数，供监控接口查看
+'''
+
+logger = logging.getLogger(__name__)
+
+
+class AIJob:
+    """一个排队中的AI任务"""
+
+    def __init__(self, name, func, args, on_done=None, on_error=None):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.on_done = on_done
+        self.on_error = on_error
+        self.submitted_at = time.monotonic()
+
+
+class AIJobQueue:
+    """有界的AI后台任务队列"""
+
+    def __init__(self, workers=2, max_queue=32, latency_window=200):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._counters = collections.Counter()
+        # 最近若干次任务的等待时间和执行时间（秒）
+        self._wait_times = collections.deque(maxlen=latency_window)
+        self._run_times = collections.deque(maxlen=latency_window)
+
+    def _ensure_workers(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._worker, name=f'ai-worker-{len(self._threads) + 1}', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, name, func, *args, on_done=None, on_error=None):
+        """提交任务，队列已满时返回False"""
+        self._ensure_workers()
+        job = AIJob(name, func, args, on_done, on_error)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._counters['rejected'] += 1
+            logger.warning(f"AI任务队列已满（{self.max_queue}），拒绝任务: {name}")
+            return False
+        with self._lock:
+            self._counters['submitted'] += 1
+        return True
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            started = time.monotonic()
+            try:
+                outcome = self._run(job)
+            finally:
+                self._queue.task_done()
+            finished = time.monotonic()
+            with self._lock:
+                self._counters[outcome] += 1
+                self._wait_times.append(started - job.submitted_at)
+                self._run_times.append(finished - started)
+
+    @staticmethod
+    def _run(job):
+        """执行任务并调用回调，返回 completed 或 failed
+
+        完成回调在任务本身的 try 之外调用：回调出错（如写任务仓库失败）只记录日志，
+        不会再调用 on_error 把已经完成的任务改成失败
+        """
+        try:
+            result = job.func(*job.args)
+        except Exception as e:
+            logger.error(f"AI任务 {job.name} 执行失败: {str(e)}", exc_info=True)
+            if job.on_error is not None:
+                try:
+                    job.on_error(e)
+                except Exception:
+                    logger.error(f"AI任务 {job.name} 失败回调出错", exc_info=True)
+            return 'failed'
+        if job.on_done is not None:
+            try:
+                job.on_done(result)
+            except Exception as e:
+                logger.error(f"AI任务 {job.name} 完成回调出错: {str(e)}", exc_info=True)
+                return 'failed'
+        return 'completed'
+
+    @staticmethod
+    def _summary(samples):
+        if not samples:
+            return {'avg_ms': 0, 'p95_ms': 0, 'max_ms': 0}
+        ordered = sorted(samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return {
+            'avg_ms': round(sum(ordered) / len(ordered) * 1000, 1),
+            'p95_ms': round(p95 * 1000, 1),
+            'max_ms': round(ordered[-1] * 1000, 1)
+        }
+
+    def metrics(self):
+        """队列长度、吞吐和延迟统计"""
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue': self.max_queue,
+                'workers': self.workers,
+                'submitted': self._counters['submitted'],
+                'completed': self._counters['completed'],
+                'failed': self._counters['failed'],
+                'rejected': self._counters['rejected'],
+                'wait_time': self._summary(self._wait_times),
+                'run_time': self._summary(self._run_times)
+            }
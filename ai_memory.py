@@ -0,0 +1,119 @@
+import collections
+import logging
+import threading
+import time
+
+'''
+AI对话记忆
+按会话（session_id，没有时按客户端地址）分别保存最近的对话轮次：
+- 每个会话按估算的token数限制大小，超出时从最早的消息开始淘汰
+- 长时间没有使用的会话自动过期，会话总数也有上限（淘汰最久未使用的）
+- 记录当前占用和淘汰次数，供监控接口查看
+'''
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text):
+    """粗略估算token数：中日韩字符按每字1个，其他字符按每4个1个"""
+    text = str(text)
+    wide = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return wide + (len(text) - wide + 3) // 4 + 4  # 每条消息的角色和格式开销
+
+
+class ConversationSession:
+    """一个会话的消息列表"""
+
+    def __init__(self):
+        self.messages = collections.deque()
+        self.tokens = 0
+        self.last_used = time.monotonic()
+
+
+class ConversationMemory:
+    """按会话隔离、有token预算和过期时间的对话记忆"""
+
+    def __init__(self, max_tokens=2000, idle_timeout=1800, max_sessions=1000):
+        # 每个会话保留的最大token数
+        self.max_tokens = max_tokens
+        # 会话空闲多久后过期（秒）
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self._counters = collections.Counter()
+
+    def _sweep(self, now):
+        """清理过期会话（调用方持有锁），最多每分钟做一次"""
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        # 会话按最近使用顺序排列，从最旧的开始检查
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used < self.idle_timeout:
+                break
+            del self._sessions[session_id]
+            self._counters['expired_sessions'] += 1
+
+    def _session(self, session_id, now):
+        """获取会话并标记为最近使用，没有时新建（调用方持有锁）"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = ConversationSession()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._counters['evicted_sessions'] += 1
+        else:
+            self._sessions.move_to_end(session_id)
+            # 已过期但还没被清理的会话，从头开始
+            if now - session.last_used >= self.idle_timeout:
+                session.messages.clear()
+                session.tokens = 0
+                self._counters['expired_sessions'] += 1
+        session.last_used = now
+        return session
+
+    def history(self, session_id):
+        """会话中保留的消息，格式与 chat.completions 的 messages 相同"""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or now - session.last_used >= self.idle_timeout:
+                return []
+            return [{'role': role, 'content': content} for role, content, _ in session.messages]
+
+    def append(self, session_id, role, content):
+        """追加一条消息，超出token预算时淘汰最早的消息"""
+        tokens = estimate_tokens(content)
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            session = self._session(session_id, now)
+            session.messages.append((role, content, tokens))
+            session.tokens += tokens
+            # 至少保留最新的一条消息；淘汰后开头不能是助手的回复，和它对应的提问一起淘汰
+            while len(session.messages) > 1 and (
+                    session.tokens > self.max_tokens or session.messages[0][0] == 'assistant'):
+                _, _, evicted = session.messages.popleft()
+                session.tokens -= evicted
+                self._counters['evicted_messages'] += 1
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def metrics(self):
+        """会话数、消息数、估算token占用和淘汰次数"""
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'messages': sum(len(s.messages) for s in self._sessions.values()),
+                'tokens': sum(s.tokens for s in self._sessions.values()),
+                'max_tokens_per_session': self.max_tokens,
+                'evicted_messages': self._counters['evicted_messages'],
+                'evicted_sessions': self._counters['evicted_sessions'],
+                'expired_sessions': self._counters['expired_sessions']
+            }
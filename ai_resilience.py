@@ -0,0 +1,179 @@
+import asyncio
+import collections
+import logging
+import random
+import threading
+import time
+
+'''
+AI调用的容错
+- 每次调用有总的截止时间，单次尝试的超时不会超过剩余时间
+- 可重试的错误（超时、连接失败、限流、服务端错误）按带随机抖动的指数退避重试
+- 连续失败达到阈值后熔断：一段时间内直接失败、不再请求，调用方立即使用兜底结果；
+  冷却后放行一次试探请求，成功则恢复，失败则继续熔断
+'''
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """熔断中，调用被直接拒绝"""
+
+
+class DeadlineExceeded(Exception):
+    """超过调用的截止时间"""
+
+
+class CircuitBreaker:
+    """连续失败计数的熔断器：closed -> open -> half_open -> closed/open"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        # 熔断后多久放行试探请求（秒）
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = 'closed'
+        self._opened_at = 0.0
+        # 正在进行的试探请求开始的时间；试探请求没有回报结果时，过了冷却时间再放行下一个
+        self._probe_at = None
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.last_failure_at = None
+        self._counters = collections.Counter()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half_open'
+            return self._state
+
+    def is_open(self):
+        """熔断中（还没到试探时间），调用方可以直接走兜底逻辑"""
+        return self.state == 'open'
+
+    def allow(self):
+        """是否放行这次调用；冷却结束后只放行一个试探请求"""
+        with self._lock:
+            if self._state == 'closed':
+                return True
+            now = time.monotonic()
+            probing = self._probe_at is not None and now - self._probe_at < self.reset_timeout
+            if now - self._opened_at < self.reset_timeout or probing:
+                self._counters['short_circuited'] += 1
+                return False
+            self._state = 'half_open'
+            self._probe_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != 'closed':
+                logger.info("AI服务已恢复，熔断器关闭")
+            self._state = 'closed'
+            self._probe_at = None
+            self.consecutive_failures = 0
+            self._counters['successes'] += 1
+
+    def record_failure(self, error):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+            self.last_failure_at = time.time()
+            self._counters['failures'] += 1
+            if self._state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                if self._state != 'open':
+                    logger.warning(f"AI服务连续失败 {self.consecutive_failures} 次，熔断 {self.reset_timeout:g} 秒")
+                    self._counters['opened'] += 1
+                self._state = 'open'
+                self._opened_at = time.monotonic()
+                self._probe_at = None
+
+    def count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def status(self):
+        state = self.state
+        with self._lock:
+            return {
+                'state': state,
+                'consecutive_failures': self.consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout': self.reset_timeout,
+                'last_error': self.last_error,
+                'last_failure_at': self.last_failure_at,
+                'successes': self._counters['successes'],
+                'failures': self._counters['failures'],
+                'retries': self._counters['retries'],
+                'short_circuited': self._counters['short_circuited'],
+                'opened': self._counters['opened']
+            }
+
+
+def _retry_delay(error, attempt, retries, expires, base_delay, max_delay, retryable):
+    """失败后是否重试：返回等待的秒数（指数退避，完全随机抖动），不重试时返回None"""
+    if not isinstance(error, retryable) or isinstance(error, DeadlineExceeded) or attempt >= retries:
+        return None
+    delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+    return delay if time.monotonic() + delay < expires else None
+
+
+def call_with_retries(func, breaker, deadline=20.0, attempt_timeout=10.0, retries=2,
+                      base_delay=0.5, max_delay=4.0, retryable=(Exception,)):
+    """
+    在截止时间内调用 func(timeout)，失败时带抖动重试
+    参数:
+        func: 接受本次尝试超时时间（秒）的函数
+        breaker: 熔断器，熔断中直接抛出 CircuitOpenError
+        deadline: 包括重试在内的总时间（秒）
+        attempt_timeout: 单次尝试的最长时间（秒）
+        retryable: 可以重试的异常类型
+    """
+    if not breaker.allow():
+        raise CircuitOpenError("AI服务熔断中")
+    expires = time.monotonic() + deadline
+    attempt = 0
+    while True:
+        remaining = expires - time.monotonic()
+        try:
+            if remaining <= 0:
+                raise DeadlineExceeded(f"AI调用超过截止时间 {deadline:g} 秒")
+            result = func(min(attempt_timeout, remaining))
+            breaker.record_success()
+            return result
+        except Exception as e:
+            delay = _retry_delay(e, attempt, retries, expires, base_delay, max_delay, retryable)
+            if delay is None:
+                breaker.record_failure(e)
+                raise
+            attempt += 1
+            breaker.count('retries')
+            logger.warning(f"AI调用失败: {str(e)}，{delay:.2f} 秒后第 {attempt} 次重试")
+            time.sleep(delay)
+
+
+async def async_call_with_retries(func, breaker, deadline=20.0, attempt_timeout=10.0, retries=2,
+                                  base_delay=0.5, max_delay=4.0, retryable=(Exception,)):
+    """call_with_retries 的 asyncio 版本，func(timeout) 返回可等待对象，等待重试时不占用线程"""
+    if not breaker.allow():
+        raise CircuitOpenError("AI服务熔断中")
+    expires = time.monotonic() + deadline
+    attempt = 0
+    while True:
+        remaining = expires - time.monotonic()
+        try:
+            if remaining <= 0:
+                raise DeadlineExceeded(f"AI调用超过截止时间 {deadline:g} 秒")
+            result = await func(min(attempt_timeout, remaining))
+            breaker.record_success()
+            return result
+        except Exception as e:
+            delay = _retry_delay(e, attempt, retries, expires, base_delay, max_delay, retryable)
+            if delay is None:
+                breaker.record_failure(e)
+                raise
+            attempt += 1
+            breaker.count('retries')
+            logger.warning(f"AI调用失败: {str(e)}，{delay:.2f} 秒后第 {attempt} 次重试")
+            await asyncio.sleep(delay)
@@ -0,0 +1,312 @@
+import asyncio
+import functools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from quart import Quart, Response, g, jsonify, render_template, request, send_file
+
+import ai_service
+import app as core
+import metrics
+from ai_service import async_chat_with_ai, async_stream_chat_with_ai, init_ai, init_async_ai
+from events import format_sse
+from task_lists import DEFAULT_LIST
+
+'''
+ASGI 入口（asyncio）
+与 app.py 提供相同的路由、模板和静态文件，但运行在 ASGI 服务器上：
+    hypercorn asgi_app:app --bind 0.0.0.0:80
+    uvicorn asgi_app:app --host 0.0.0.0 --port 80
+- 业务逻辑、任务仓库、计时器、事件推送、AI后台任务和开发板连接都与 app.py 共用（导入 app 模块时初始化）
+- /chat-with-ai 使用 AsyncOpenAI，等待模型回复时不占用线程；SSE 连接（/events、完成建议流）是协程，
+  一个进程可以同时保持成千上万个在途请求
+- 任务仓库的读写（可能写文件）放到固定大小的线程池执行，线程数与在途请求数无关
+- 开发板只是把完成率交给串口线程（不等待串口通信），AI时长估计和完成建议仍在 AI 后台任务队列中执行
+'''
+
+logger = logging.getLogger(__name__)
+
+app = Quart(__name__)
+# SSE 连接可能一直保持，不限制响应时间
+app.config['RESPONSE_TIMEOUT'] = None
+
+# 阻塞的存储操作使用的线程池
+io_executor = ThreadPoolExecutor(max_workers=int(os.getenv('ASGI_IO_WORKERS', '8')), thread_name_prefix='asgi-io')
+
+
+async def run_io(func, *args):
+    """在存储线程池中执行阻塞操作"""
+    return await asyncio.get_running_loop().run_in_executor(io_executor, func, *args)
+
+
+async def respond(handler, *args):
+    """在存储线程池中执行 app.py 的 handle_* 函数并转换为 Quart 响应"""
+    payload, status = await run_io(handler, *args)
+    return jsonify(payload), status
+
+
+def with_task_list(view):
+    """把路由中的 list_id 换成任务清单（第一次打开清单需要读文件，在存储线程池中执行；只读请求不创建清单）"""
+    @functools.wraps(view)
+    async def wrapper(*args, list_id=DEFAULT_LIST, **kwargs):
+        create = request.method not in core.READ_ONLY_METHODS
+        task_list, error = await run_io(core.open_task_list, list_id, create)
+        if error is not None:
+            payload, status = error
+            return jsonify(payload), status
+        return await view(task_list, *args, **kwargs)
+    return wrapper
+
+
+def event_stream_response(body):
+    response = Response(
+        body,
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.timeout = None
+    return response
+
+
+@app.before_serving
+async def startup():
+    # 后台任务使用同步客户端，/chat-with-ai 使用异步客户端
+    init_ai()
+    init_async_ai()
+    logger.info("TodoList ASGI 应用启动")
+
+
+@app.after_serving
+async def shutdown():
+    if ai_service.async_client is not None:
+        await ai_service.async_client.close()
+
+
+# 请求计数和延迟与 app.py 记录到同一组指标
+@app.before_request
+async def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+async def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe_request(request.method, route, response.status_code, time.perf_counter() - started)
+    return response
+
+
+@app.route("/")
+@app.route("/lists/<list_id>/")
+@with_task_list
+async def index(task_list):
+    return await render_template("index.html", **await run_io(core.index_context, task_list))
+
+
+@app.route('/chat-with-ai', methods=['POST'])
+async def api_chat_with_ai():
+    """AI对话API端点，参数和返回值与 app.py 相同"""
+    try:
+        params = core.chat_request_params(
+            await request.get_json(silent=True), request.headers.get('X-Session-Id'), request.remote_addr)
+        if params is None:
+            return jsonify({'error': '消息内容不能为空'}), 400
+        logger.info(f"收到AI对话请求，消息长度: {len(params['user_message'])}")
+        args = (params['user_message'], params['prompt'])
+        kwargs = {'session_id': params['session_id'], 'use_history': params['use_history']}
+
+        if params['stream']:
+            async def generate():
+                chunks = []
+                async for delta in async_stream_chat_with_ai(*args, **kwargs):
+                    chunks.append(delta)
+                    yield format_sse('delta', {'text': delta})
+                response = ''.join(chunks).strip()
+                yield format_sse('done', {'response': response or '0', 'success': bool(response)})
+            return event_stream_response(generate())
+
+        response = await async_chat_with_ai(*args, **kwargs)
+        return jsonify({'response': response, 'success': True})
+    except Exception as e:
+        logger.error(f"处理AI对话请求时出错: {str(e)}", exc_info=True)
+        return jsonify({'error': f'处理请求失败: {str(e)}', 'success': False, 'response': '0'}), 500
+
+
+@app.route('/tasks', methods=['GET'])
+@app.route('/lists/<list_id>/tasks', methods=['GET'])
+@with_task_list
+async def list_tasks(task_list):
+    return await respond(core.handle_list_tasks, task_list, request.args.to_dict())
+
+
+@app.route('/tasks/batch', methods=['POST'])
+@app.route('/lists/<list_id>/tasks/batch', methods=['POST'])
+@with_task_list
+async def batch_tasks(task_list):
+    return await respond(core.handle_batch_tasks, task_list, await request.get_json(silent=True))
+
+
+@app.route('/toggle-task/<int:task_id>', methods=['POST'])
+@app.route('/lists/<list_id>/toggle-task/<int:task_id>', methods=['POST'])
+@with_task_list
+async def toggle_task(task_list, task_id):
+    return await respond(core.handle_toggle_task, task_list, task_id)
+
+
+@app.route('/add-task', methods=['POST'])
+@app.route('/lists/<list_id>/add-task', methods=['POST'])
+@with_task_list
+async def add_task(task_list):
+    return await respond(core.handle_add_task, task_list, await request.get_json(silent=True))
+
+
+@app.route('/import-tasks', methods=['POST'])
+@app.route('/lists/<list_id>/import-tasks', methods=['POST'])
+@with_task_list
+async def import_tasks(task_list):
+    if request.is_json:
+        body = await request.get_json(silent=True)
+    else:
+        body = await request.get_data(as_text=True)
+    return await respond(core.handle_import_tasks, task_list, body)
+
+
+@app.route('/delete-task/<int:task_id>', methods=['DELETE'])
+@app.route('/lists/<list_id>/delete-task/<int:task_id>', methods=['DELETE'])
+@with_task_list
+async def delete_task(task_list, task_id):
+    return await respond(core.handle_delete_task, task_list, task_id)
+
+
+@app.route('/rename-task/<int:task_id>', methods=['PUT'])
+@app.route('/lists/<list_id>/rename-task/<int:task_id>', methods=['PUT'])
+@with_task_list
+async def rename_task(task_list, task_id):
+    return await respond(core.handle_rename_task, task_list, task_id, await request.get_json(silent=True))
+
+
+@app.route('/update-duration/<int:task_id>', methods=['PUT'])
+@app.route('/lists/<list_id>/update-duration/<int:task_id>', methods=['PUT'])
+@with_task_list
+async def update_duration(task_list, task_id):
+    return await respond(core.handle_update_duration, task_list, task_id, await request.get_json(silent=True))
+
+
+@app.route('/update-timing/<int:task_id>', methods=['PUT'])
+@app.route('/lists/<list_id>/update-timing/<int:task_id>', methods=['PUT'])
+@with_task_list
+async def update_timing(task_list, task_id):
+    return await respond(core.handle_update_timing, task_list, task_id, await request.get_json(silent=True))
+
+
+@app.route('/get-task-time/<int:task_id>', methods=['GET'])
+@app.route('/lists/<list_id>/get-task-time/<int:task_id>', methods=['GET'])
+@with_task_list
+async def get_task_time(task_list, task_id):
+    return await respond(core.handle_get_task_time, task_list, task_id)
+
+
+@app.route('/get-task-times', methods=['GET'])
+@app.route('/lists/<list_id>/get-task-times', methods=['GET'])
+@with_task_list
+async def get_task_times(task_list):
+    return await respond(core.handle_get_task_times, task_list, request.args.get('ids'))
+
+
+@app.route('/ai-result/<int:task_id>', methods=['GET'])
+@app.route('/lists/<list_id>/ai-result/<int:task_id>', methods=['GET'])
+@with_task_list
+async def get_ai_result(task_list, task_id):
+    return await respond(core.handle_get_ai_result, task_list, task_id)
+
+
+@app.route('/ai-suggestion/<int:task_id>/stream')
+@app.route('/lists/<list_id>/ai-suggestion/<int:task_id>/stream')
+@with_task_list
+async def stream_ai_suggestion(task_list, task_id):
+    """SSE：逐段推送正在生成的完成建议（delta 事件），结束时推送最终结果（done 事件）"""
+    task_store = task_list.store
+    task = await run_io(task_store.get, task_id)
+    if not task:
+        return jsonify({'error': '任务不存在', 'success': False}), 404
+    buffer = core.suggestion_streams.get((task_list.list_id, task_id))
+
+    async def generate():
+        yield 'retry: 3000\n\n'
+        if buffer is not None:
+            async for text in buffer.follow_async():
+                yield format_sse('delta', {'text': text}) if text is not None else ': keepalive\n\n'
+        result = await run_io(task_store.get, task_id) or task
+        yield format_sse('done', core.ai_result_payload(result))
+
+    return event_stream_response(generate())
+
+
+@app.route('/events')
+@app.route('/lists/<list_id>/events')
+@with_task_list
+async def events(task_list):
+    """SSE事件流，每个连接是一个协程"""
+    # 统计要获取任务仓库的锁（写盘、事务期间会被占用），在存储线程池中读取
+    stats = await run_io(core.build_stats, task_list)
+    subscriber = core.event_broker.subscribe_async(task_list.list_id)
+    subscriber.queue.put_nowait(format_sse('stats', stats))
+    return event_stream_response(core.event_broker.stream_async(subscriber))
+
+
+# 任务统计要获取任务仓库的锁（写盘、事务、批量修改期间会被占用），在存储线程池中读取
+@app.route('/stats', methods=['GET'])
+@app.route('/lists/<list_id>/stats', methods=['GET'])
+@with_task_list
+async def get_stats(task_list):
+    return jsonify(await run_io(core.build_stats, task_list))
+
+
+# /metrics 中包含各清单的任务数，同样在存储线程池中生成
+@app.route('/metrics', methods=['GET'])
+async def get_metrics():
+    return Response(await run_io(metrics.registry.render), content_type=metrics.CONTENT_TYPE)
+
+
+# 以下监控接口只读取 AI 任务队列、开发板连接等的内存计数（它们的锁只在更新计数时短暂持有），直接在事件循环中执行
+@app.route('/ai-jobs/metrics', methods=['GET'])
+async def get_ai_job_metrics():
+    return jsonify(core.ai_jobs.metrics())
+
+
+@app.route('/board/status', methods=['GET'])
+async def get_board_status():
+    return jsonify(core.board_link.status())
+
+
+@app.route('/ai-cache/stats', methods=['GET'])
+async def get_ai_cache_stats():
+    return jsonify(dict(core.estimate_cache.stats(), local_predictor=core.duration_predictor.stats()))
+
+
+@app.route('/ai/health', methods=['GET'])
+async def get_ai_health():
+    return jsonify(core.ai_health())
+
+
+@app.route('/ai-memory/metrics', methods=['GET'])
+async def get_ai_memory_metrics():
+    return jsonify(core.conversation_memory.metrics())
+
+
+@app.route('/sounds/end.mp3')
+async def get_end_sound():
+    sound_path = await run_io(core.end_sound_path)
+    try:
+        return await send_file(sound_path, mimetype='audio/mpeg')
+    except Exception as e:
+        logger.error(f"发送音频文件失败: {str(e)}", exc_info=True)
+        return jsonify({'error': '获取音频文件失败'}), 500
+
+
+# 开发时直接运行（内置的 hypercorn），生产环境请用上面的 ASGI 服务器命令启动
+if __name__ == '__main__':
+    app.run(port=80, host="0.0.0.0")
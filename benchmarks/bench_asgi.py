@@ -0,0 +1,207 @@
+"""
+多线程 Flask 与 ASGI 入口的并发对比
+
+启动一个有固定延迟的模拟AI服务（tools/fake_ai.py），再分别以两种模式启动应用（各自独立的进程和临时目录）：
+- flask：app.py + werkzeug 多线程服务器（与 app.run(threaded=True) 相同，每个连接一个线程）
+- asgi：asgi_app.py + hypercorn（asyncio，AI请求用 AsyncOpenAI）
+对每个并发数 C，同时发出 C 个 /chat-with-ai 请求（每个都要等待模拟AI的延迟），期间每 0.1 秒
+请求一次 /stats，统计：完成数、错误数、总耗时、延迟分位数、慢请求期间快请求的延迟，
+以及服务进程的峰值线程数和内存。
+
+用法:
+    python benchmarks/bench_asgi.py
+    python benchmarks/bench_asgi.py --concurrency 100,1000,3000 --ai-latency 2
+    python benchmarks/bench_asgi.py --modes asgi
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# 两种模式使用相同的监听队列长度，只比较并发模型
+LISTEN_BACKLOG = 2048
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# ============ 服务进程 ============
+
+def serve(mode, port):
+    """在当前目录加载应用并启动服务器（在子进程中运行）"""
+    sys.path.insert(0, ROOT)
+    if mode == 'flask':
+        from werkzeug.serving import make_server
+        import app as todolist
+        logging.disable(logging.CRITICAL)
+        server = make_server('127.0.0.1', port, todolist.app, threaded=True)
+        server.socket.listen(LISTEN_BACKLOG)
+        server.serve_forever()
+    else:
+        from hypercorn.asyncio import serve as hypercorn_serve
+        from hypercorn.config import Config
+        import asgi_app
+        logging.disable(logging.CRITICAL)
+        config = Config()
+        config.bind = [f'127.0.0.1:{port}']
+        config.backlog = LISTEN_BACKLOG
+        config.accesslog = None
+        asyncio.run(hypercorn_serve(asgi_app.app, config))
+
+
+def process_usage(pid):
+    """进程当前的线程数和常驻内存（MB），读取 /proc（仅限 Linux）"""
+    threads, rss = 0, 0.0
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    threads = int(line.split()[1])
+                elif line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return threads, rss
+
+
+# ============ 客户端 ============
+
+async def http_request(port, method, path, body=None, timeout=60):
+    """发送一个 HTTP/1.1 请求（Connection: close），返回状态码"""
+    data = json.dumps(body).encode() if body is not None else b''
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        writer.write(f'{method} {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nConnection: close\r\n'
+                     f'Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n'.encode() + data)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+        return int(response.split(b' ', 2)[1])
+    finally:
+        writer.close()
+
+
+async def timed_request(port, method, path, body, latencies, errors):
+    started = time.perf_counter()
+    try:
+        status = await http_request(port, method, path, body)
+        if status != 200:
+            raise ValueError(status)
+        latencies.append(time.perf_counter() - started)
+    except Exception as e:
+        errors.append(type(e).__name__)
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {}
+    values = np.array(latencies) * 1000
+    return {name: round(float(np.percentile(values, q)), 1) for name, q in (('p50', 50), ('p95', 95), ('p99', 99))}
+
+
+async def run_level(port, pid, concurrency):
+    latencies, errors = [], []
+    probe_latencies, probe_errors = [], []
+    peak_threads, peak_rss = process_usage(pid)
+    body = {'message': '你好', 'prompt': '你是一个助手'}
+
+    started = time.perf_counter()
+    load = asyncio.gather(*(timed_request(port, 'POST', '/chat-with-ai', body, latencies, errors)
+                            for _ in range(concurrency)))
+    load = asyncio.ensure_future(load)
+    while not load.done():
+        await asyncio.gather(timed_request(port, 'GET', '/stats', None, probe_latencies, probe_errors),
+                             asyncio.sleep(0.1))
+        threads, rss = process_usage(pid)
+        peak_threads, peak_rss = max(peak_threads, threads), max(peak_rss, rss)
+    elapsed = time.perf_counter() - started
+
+    return {
+        'concurrency': concurrency,
+        'completed': len(latencies),
+        'errors': len(errors),
+        'error_types': sorted(set(errors)),
+        'seconds': round(elapsed, 2),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'latency_ms': percentiles(latencies),
+        'stats_probe_ms': percentiles(probe_latencies),
+        'server_threads_peak': peak_threads,
+        'server_rss_mb_peak': round(peak_rss, 1)
+    }
+
+
+# ============ 主流程 ============
+
+def start_server(mode, env):
+    workdir = tempfile.mkdtemp(prefix=f'todolist-bench-{mode}-')
+    shutil.copy(os.path.join(ROOT, 'tasks.json'), workdir)
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', mode, '--port', str(port)],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if asyncio.run(http_request(port, 'GET', '/stats', timeout=2)) == 200:
+                return process, port, workdir
+        except Exception:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{mode} 服务启动失败')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多线程 Flask 与 ASGI 入口的并发对比')
+    parser.add_argument('--concurrency', default='50,200,1000', help='逗号分隔的并发请求数')
+    parser.add_argument('--ai-latency', type=float, default=1.0, help='模拟AI服务的延迟（秒）')
+    parser.add_argument('--modes', default='flask,asgi')
+    parser.add_argument('--serve', choices=['flask', 'asgi'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    ai_port = free_port()
+    fake_ai = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'tools', 'fake_ai.py'), '--port', str(ai_port),
+         '--latency', str(args.ai_latency)],
+        stdout=subprocess.DEVNULL
+    )
+    env = dict(
+        os.environ,
+        AI_API_URL=f'http://127.0.0.1:{ai_port}/v1', API_KEY='bench', AI_MODEL='fake',
+        BOARD_SINK='none://', AI_TIMEOUT=str(args.ai_latency + 30), AI_DEADLINE=str(args.ai_latency + 60)
+    )
+    levels = [int(value) for value in args.concurrency.split(',')]
+    result = {'ai_latency': args.ai_latency, 'modes': {}}
+    try:
+        for mode in args.modes.split(','):
+            process, port, workdir = start_server(mode, env)
+            try:
+                result['modes'][mode] = [asyncio.run(run_level(port, process.pid, level)) for level in levels]
+            finally:
+                process.kill()
+                process.wait()
+                shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        fake_ai.kill()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+事件推送（SSE）与轮询的负载对比
+
+在临时目录里启动应用（多线程 werkzeug 服务器），开启 K 个计时任务，然后分别用
+C 个客户端跑 T 秒：
+- polling：每个客户端每秒请求一次 /get-task-times（当前的轮询兜底方式）
+- sse：每个客户端只打开一个 /events 连接，被动接收计时刷新
+同时给出旧设计（每个计时任务每秒一次 /get-task-time）的理论请求数作为参照。
+
+用法:
+    python benchmarks/bench_events.py
+    python benchmarks/bench_events.py --clients 300 --timers 8 --seconds 10
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def boot_app(timer_count):
+    """在临时目录中加载应用并启动服务器，返回 (基础URL, 服务器)"""
+    workdir = tempfile.mkdtemp(prefix='todolist-bench-')
+    tasks = [
+        {
+            'id': i,
+            'title': f'任务{i}',
+            'completed': False,
+            'duration': 60,
+            'is_timing': False,
+            'time_remaining': 60,
+            'ai_duration': 0
+        }
+        for i in range(1, timer_count + 1)
+    ]
+    with open(os.path.join(workdir, 'tasks.json'), 'w', encoding='utf-8') as f:
+        json.dump(tasks, f, ensure_ascii=False)
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    import app as todolist  # noqa: E402
+    logging.disable(logging.INFO)
+
+    server = make_server('127.0.0.1', 0, todolist.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    for task in tasks:
+        requests.put(f"{base_url}/update-timing/{task['id']}", json={'is_timing': True, 'time_remaining': 60})
+    return base_url, server
+
+
+def run_polling(base_url, clients, timer_ids, seconds):
+    counters = {'requests': 0, 'bytes': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+    url = f"{base_url}/get-task-times?ids={','.join(map(str, timer_ids))}"
+
+    def client():
+        session = requests.Session()
+        next_tick = time.monotonic()
+        while time.monotonic() < deadline:
+            try:
+                response = session.get(url, timeout=5)
+                size = len(response.content)
+                with lock:
+                    counters['requests'] += 1
+                    counters['bytes'] += size
+            except requests.RequestException:
+                with lock:
+                    counters['errors'] += 1
+            next_tick += 1
+            time.sleep(max(0, next_tick - time.monotonic()))
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counters
+
+
+def run_sse(base_url, clients, seconds):
+    counters = {'requests': 0, 'bytes': 0, 'events': 0, 'errors': 0}
+    lock = threading.Lock()
+    responses = []
+
+    def client():
+        try:
+            response = requests.get(f'{base_url}/events', stream=True, timeout=30)
+        except requests.RequestException:
+            with lock:
+                counters['errors'] += 1
+            return
+        with lock:
+            counters['requests'] += 1
+            responses.append(response)
+        try:
+            for line in response.iter_lines():
+                with lock:
+                    counters['bytes'] += len(line) + 1
+                    if line.startswith(b'event: timers'):
+                        counters['events'] += 1
+        except Exception:
+            # 测试结束时主动关闭连接
+            pass
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    with lock:
+        for response in responses:
+            response.close()
+    return counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SSE 与轮询的负载对比')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--timers', type=int, default=5)
+    parser.add_argument('--seconds', type=int, default=10)
+    args = parser.parse_args()
+
+    base_url, server = boot_app(args.timers)
+    timer_ids = list(range(1, args.timers + 1))
+
+    polling = run_polling(base_url, args.clients, timer_ids, args.seconds)
+    sse = run_sse(base_url, args.clients, args.seconds)
+    server.shutdown()
+
+    result = {
+        'clients': args.clients,
+        'timers': args.timers,
+        'seconds': args.seconds,
+        'legacy_per_timer_polling': {'requests': args.clients * args.timers * args.seconds},
+        'bulk_polling': polling,
+        'sse': sse,
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
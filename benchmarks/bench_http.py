@@ -0,0 +1,231 @@
+"""
+全部路由的 HTTP 基准测试
+
+对每个任务数量（默认 10 → 100k）在独立的临时目录中生成任务数据并启动应用（独立进程），
+AI服务换成本地模拟服务（tools/fake_ai.py），开发板换成内存中的模拟开发板（BOARD_SINK=sim://），
+两者的延迟都可以设置。然后按顺序压测每个路由：每个路由发出 N 个请求，最多 C 个同时进行，
+统计吞吐量和延迟分位数，以 JSON 输出，便于比较不同版本的存储和统计开销。
+
+结果中每个任务数量一项：
+- startup_seconds：启动到可以响应的时间（加载任务、导入数据库等）
+- routes：每个路由的请求数、错误数、吞吐量（请求/秒）和 p50/p95/p99 延迟（毫秒）
+- server_rss_mb：压测结束时服务进程的常驻内存
+
+用法:
+    python benchmarks/bench_http.py
+    python benchmarks/bench_http.py --sizes 10,1000 --requests 500 --concurrency 20
+    python benchmarks/bench_http.py --routes index,toggle_task,stats --backend sqlite --output result.json
+    python benchmarks/bench_http.py --mode asgi --ai-latency 0.5 --board-latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_asgi import free_port, http_request, percentiles, process_usage, serve, timed_request
+
+TOOLS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools')
+
+
+def make_tasks(count, rng):
+    """生成任务数据：约一半已完成，约1%正在计时"""
+    now = time.time()
+    tasks = []
+    for task_id in range(1, count + 1):
+        timing = rng.random() < 0.01
+        duration = rng.randint(5, 120)
+        tasks.append({
+            'id': task_id,
+            'title': f'任务{task_id}',
+            'completed': not timing and rng.random() < 0.5,
+            'duration': duration,
+            'is_timing': timing,
+            'time_remaining': duration,
+            'timing_started_at': now if timing else None,
+            'ai_duration': duration,
+            'ai_status': 'done'
+        })
+    return tasks
+
+
+class Routes:
+    """每个路由第 i 个请求的 (方法, 路径, 请求体)；任务ID由固定种子的随机数生成，结果可重复"""
+
+    def __init__(self, task_count, seed):
+        self.task_count = task_count
+        self.rng = random.Random(seed)
+        # 删除放在最后，从ID最大的任务（包括 add_task 新增的）开始删
+        self.added = 0
+
+    def random_id(self):
+        return self.rng.randint(1, self.task_count)
+
+    def request(self, name, i):
+        if name == 'index':
+            return 'GET', '/', None
+        if name == 'tasks_page':
+            return 'GET', '/tasks?completed=false&sort=title&limit=50', None
+        if name == 'stats':
+            return 'GET', '/stats', None
+        if name == 'add_task':
+            self.added += 1
+            return 'POST', '/add-task', {'title': f'压测任务{i}', 'duration': 10}
+        if name == 'toggle_task':
+            return 'POST', f'/toggle-task/{self.random_id()}', None
+        if name == 'rename_task':
+            return 'PUT', f'/rename-task/{self.random_id()}', {'title': f'重命名{i}'}
+        if name == 'update_duration':
+            return 'PUT', f'/update-duration/{self.random_id()}', {'duration': 30}
+        if name == 'update_timing':
+            return 'PUT', f'/update-timing/{self.random_id()}', {'is_timing': i % 2 == 0}
+        if name == 'get_task_time':
+            return 'GET', f'/get-task-time/{self.random_id()}', None
+        if name == 'get_task_times':
+            return 'GET', '/get-task-times', None
+        if name == 'batch':
+            operations = [{'op': 'toggle', 'id': self.random_id()} for _ in range(10)]
+            return 'POST', '/tasks/batch', {'operations': operations}
+        if name == 'chat_with_ai':
+            return 'POST', '/chat-with-ai', {'message': '今天先做什么？', 'prompt': '你是一个任务助手'}
+        if name == 'delete_task':
+            task_id = self.task_count + self.added - i
+            return 'DELETE', f'/delete-task/{task_id}', None
+        raise ValueError(f'未知路由: {name}')
+
+
+# 压测顺序：只读路由在前，删除在最后
+ROUTES = ('index', 'tasks_page', 'stats', 'get_task_time', 'get_task_times', 'add_task', 'toggle_task',
+          'rename_task', 'update_duration', 'update_timing', 'batch', 'chat_with_ai', 'delete_task')
+
+
+async def drive(port, routes, name, total, concurrency):
+    """用 concurrency 个并发客户端发出 total 个请求"""
+    latencies, errors = [], []
+    requests_left = iter(range(total))
+
+    async def client():
+        for i in requests_left:
+            method, path, body = routes.request(name, i)
+            await timed_request(port, method, path, body, latencies, errors)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': total,
+        'errors': len(errors),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed > 0 else 0,
+        'latency_ms': percentiles(latencies)
+    }
+
+
+def start_server(mode, workdir, env):
+    """启动服务进程并等待可以响应，返回 (进程, 端口, 启动耗时)"""
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', mode, '--port', str(port)],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 300
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            if asyncio.run(http_request(port, 'GET', '/stats', timeout=2)) == 200:
+                return process, port, time.perf_counter() - started
+        except Exception:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'{mode} 服务启动失败')
+
+
+def run_size(task_count, args, env, route_names):
+    workdir = tempfile.mkdtemp(prefix=f'todolist-bench-http-{task_count}-')
+    rng = random.Random(args.seed)
+    with open(os.path.join(workdir, 'tasks.json'), 'w', encoding='utf-8') as f:
+        json.dump(make_tasks(task_count, rng), f, ensure_ascii=False)
+    # 上限留出 add_task 的空间
+    env = dict(env, MAX_TASKS=str(task_count + args.requests * 2))
+    process, port, startup = start_server(args.mode, workdir, env)
+    try:
+        routes = Routes(task_count, args.seed)
+        asyncio.run(drive(port, routes, 'stats', args.warmup, args.concurrency))
+        result = {'tasks': task_count, 'startup_seconds': round(startup, 2), 'routes': {}}
+        for name in route_names:
+            result['routes'][name] = asyncio.run(drive(port, routes, name, args.requests, args.concurrency))
+            print(json.dumps({'tasks': task_count, 'route': name, **result['routes'][name]}, ensure_ascii=False),
+                  file=sys.stderr)
+        result['server_rss_mb'] = round(process_usage(process.pid)[1], 1)
+        return result
+    finally:
+        process.kill()
+        process.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='全部路由的 HTTP 基准测试')
+    parser.add_argument('--sizes', default='10,1000,10000,100000', help='逗号分隔的任务数量')
+    parser.add_argument('--routes', default=','.join(ROUTES), help='逗号分隔的路由名')
+    parser.add_argument('--requests', type=int, default=200, help='每个路由的请求数')
+    parser.add_argument('--concurrency', type=int, default=10, help='同时进行的请求数')
+    parser.add_argument('--warmup', type=int, default=20, help='正式压测前的预热请求数')
+    parser.add_argument('--mode', choices=['flask', 'asgi'], default='flask')
+    parser.add_argument('--backend', choices=['json', 'journal', 'sqlite'], default='json', help='任务存储后端')
+    parser.add_argument('--ai-latency', type=float, default=0.05, help='模拟AI服务的延迟（秒）')
+    parser.add_argument('--board-latency', type=float, default=0.01, help='模拟开发板的确认延迟（秒）')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='结果另存为JSON文件')
+    parser.add_argument('--serve', choices=['flask', 'asgi'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    route_names = [name for name in args.routes.split(',') if name]
+    unknown = set(route_names) - set(ROUTES)
+    if unknown:
+        parser.error(f"未知路由: {', '.join(sorted(unknown))}，可选: {', '.join(ROUTES)}")
+
+    ai_port = free_port()
+    fake_ai = subprocess.Popen(
+        [sys.executable, os.path.join(TOOLS, 'fake_ai.py'), '--port', str(ai_port), '--latency', str(args.ai_latency)],
+        stdout=subprocess.DEVNULL
+    )
+    env = dict(
+        os.environ,
+        AI_API_URL=f'http://127.0.0.1:{ai_port}/v1', API_KEY='bench', AI_MODEL='fake',
+        BOARD_SINK=f'sim://?latency={args.board_latency}', TASKS_BACKEND=args.backend
+    )
+    result = {
+        'config': {
+            'mode': args.mode, 'backend': args.backend, 'requests': args.requests,
+            'concurrency': args.concurrency, 'ai_latency': args.ai_latency, 'board_latency': args.board_latency,
+            'seed': args.seed
+        },
+        'results': []
+    }
+    try:
+        for size in (int(value) for value in args.sizes.split(',')):
+            result['results'].append(run_size(size, args, env, route_names))
+    finally:
+        fake_ai.kill()
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+任务存储后端基准测试
+
+对比 json（整体重写）与 journal（追加日志）两种后端在不同任务数量下
+“修改 + 落盘”的延迟。每次修改后立即调用 flush()，相当于最坏情况下
+每个请求都要写一次盘；journal 后端的压缩开销也会体现在 p99 里。
+
+用法:
+    python benchmarks/bench_storage.py
+    python benchmarks/bench_storage.py --sizes 100 1000 100000 --mutations 500
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from task_store import TaskStore, create_backend, write_json_atomic  # noqa: E402
+
+
+def make_tasks(count):
+    return [
+        {
+            'id': i,
+            'title': f'任务{i}',
+            'completed': i % 3 == 0,
+            'duration': 10,
+            'is_timing': False,
+            'time_remaining': 10,
+            'ai_duration': 0
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def bench_backend(backend_name, size, mutations, time_budget):
+    """返回单个后端在给定任务数量下的延迟统计（毫秒）"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'tasks.json')
+        write_json_atomic(path, make_tasks(size))
+        store = TaskStore(create_backend(backend_name, path), flush_delay=3600)
+        store.load()
+
+        latencies = []
+        ops = ('toggle', 'rename', 'duration', 'timing')
+        started = time.perf_counter()
+        for i in range(mutations):
+            task_id = (i * 7919) % size + 1
+            op = ops[i % len(ops)]
+            if op == 'toggle':
+                changes = {'completed': bool(i % 2)}
+            elif op == 'rename':
+                changes = {'title': f'任务{task_id}-{i}'}
+            elif op == 'duration':
+                changes = {'duration': i % 60, 'time_remaining': i % 60}
+            else:
+                changes = {'is_timing': bool(i % 2)}
+
+            t0 = time.perf_counter()
+            store.update(task_id, changes, op=op)
+            store.flush()
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+            # 整体重写在大数据量下非常慢，超过时间预算就提前结束
+            if time.perf_counter() - started > time_budget:
+                break
+
+        store.close()
+        return {
+            'backend': backend_name,
+            'tasks': size,
+            'mutations': len(latencies),
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'max_ms': round(max(latencies), 3),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='任务存储后端基准测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--backends', nargs='+', default=['json', 'journal'])
+    parser.add_argument('--mutations', type=int, default=2000)
+    parser.add_argument('--time-budget', type=float, default=20.0, help='每组测试的最长时间（秒）')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = []
+    for size in args.sizes:
+        for backend_name in args.backends:
+            result = bench_backend(backend_name, size, args.mutations, args.time_budget)
+            results.append(result)
+            print(json.dumps(result, ensure_ascii=False), file=sys.stderr)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+本地时长预测的离线评估
+
+按完成时间顺序回放 AIHistory.jsonl：每条记录只用它之前的历史做预测，
+与记录的目标时长（实际用时，没有时为用户设置的时长）比较，统计：
+- 本地预测：覆盖率（置信度足够、直接使用的比例）、平均绝对误差、单次预测耗时
+- 模型：记录中保存的 ai_duration 在同一批记录上的平均绝对误差
+加 --live 时对每个任务名实际调用一次模型，测量模型的误差和延迟（需要配置 .env）。
+
+用法:
+    python benchmarks/eval_predictor.py
+    python benchmarks/eval_predictor.py --history path/to/AIHistory.jsonl --min-confidence 0.6
+    python benchmarks/eval_predictor.py --live --limit 50
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import dotenv
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from ai_history import TaskHistory  # noqa: E402
+from duration_predictor import DurationPredictor, record_target  # noqa: E402
+
+
+def summarize(errors, latencies=None):
+    result = {'count': len(errors)}
+    if errors:
+        errors = np.array(errors)
+        result['mae_minutes'] = round(float(errors.mean()), 2)
+        result['median_abs_error'] = round(float(np.median(errors)), 2)
+    if latencies:
+        latencies = np.array(latencies) * 1000
+        result['latency_ms'] = {
+            'avg': round(float(latencies.mean()), 3),
+            'p95': round(float(np.percentile(latencies, 95)), 3),
+            'max': round(float(latencies.max()), 3)
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地时长预测与模型估计的离线对比')
+    parser.add_argument('--history', default=os.path.join(ROOT, 'AIHistory.jsonl'))
+    parser.add_argument('--min-confidence', type=float, default=0.75)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--live', action='store_true', help='实际调用模型进行对比')
+    parser.add_argument('--limit', type=int, default=0, help='只评估最后 N 条记录（0 表示全部）')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    history = TaskHistory(args.history)
+    if not os.path.exists(args.history):
+        print(f"历史文件 {args.history} 不存在，先完成一些任务再评估")
+        return
+    history.load()
+    records = sorted(history.records, key=lambda r: r.get('completed_at', 0))
+    start = max(0, len(records) - args.limit) if args.limit else 0
+
+    predictor = DurationPredictor(k=args.k, min_confidence=args.min_confidence)
+    predictor.load(records[:start])
+
+    local_errors, local_latencies = [], []
+    model_errors, model_on_local = [], []
+    live_errors, live_latencies = [], []
+    evaluated = 0
+    if args.live:
+        # ai_service 导入时读取AI配置，先加载 .env
+        dotenv.load_dotenv(os.path.join(ROOT, '.env'))
+        if not os.getenv('API_KEY'):
+            sys.exit('--live 需要在 .env 或环境变量中配置 API_KEY、AI_API_URL 和 AI_MODEL')
+        from ai_service import init_ai, estimate_task_duration
+        if not init_ai():
+            sys.exit('AI客户端初始化失败，请检查 .env 中的AI配置')
+
+    for record in records[start:]:
+        target = record_target(record)
+        if target:
+            evaluated += 1
+            started = time.perf_counter()
+            prediction, _ = predictor.predict(record['title'])
+            local_latencies.append(time.perf_counter() - started)
+            ai_duration = record.get('ai_duration')
+            if ai_duration:
+                model_errors.append(abs(ai_duration - target))
+            if prediction is not None:
+                local_errors.append(abs(prediction - target))
+                if ai_duration:
+                    model_on_local.append(abs(ai_duration - target))
+            if args.live:
+                started = time.perf_counter()
+                estimate = estimate_task_duration(record['title'])
+                live_latencies.append(time.perf_counter() - started)
+                if estimate:
+                    live_errors.append(abs(estimate - target))
+        predictor.add(record)
+
+    result = {
+        'records': len(records),
+        'evaluated': evaluated,
+        'local': dict(summarize(local_errors, local_latencies),
+                      coverage=round(len(local_errors) / evaluated, 3) if evaluated else 0),
+        'model_recorded': summarize(model_errors),
+        # 只在本地预测给出结果的那些记录上比较，两者误差可以直接对照
+        'model_recorded_on_local_covered': summarize(model_on_local),
+    }
+    if args.live:
+        result['model_live'] = summarize(live_errors, live_latencies)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,439 @@
+import collections
+import logging
+import os
+import random
+import select
+import socket
+import threading
+import time
+from urllib.parse import urlsplit, parse_qs
+
+import metrics
+
+'''
+51开发板连接
+完成率由一个专门的I/O线程发送到显示设备（sink），请求处理线程只把完成率交给它，立即返回：
+- 只在建立连接时检查端口并等待开发板初始化，之后一直复用同一个连接
+- 连接失败或通信出错时关闭连接，按指数退避重连，待发送的数据保留到重连后再发
+- 开发板收到 "P<完成率>\n" 后回复一个字节 'P'（没有换行）作为确认
+- 只保留最新的完成率：发送前被新值覆盖的旧值直接丢弃；开发板已确认显示的值不重复发送；
+  两次写入之间至少间隔 min_interval 秒，请求再多每秒也只有几次串口写入
+
+显示设备通过 BOARD_SINK 配置：
+- serial://COM4?baudrate=9600 或 serial:///dev/ttyUSB0：真实串口（需要 pyserial）
+- tcp://host:port：串口服务器或网络上的模拟开发板
+- file:///dev/pts/3：设备文件或普通文件（如 tools/fake_board.py 创建的 pty）
+- sim://?latency=0.02&drop=0.1&disconnect=0.01：内存中的模拟开发板，可注入延迟、丢失确认和断线
+- none://：不连接任何设备
+'''
+
+logger = logging.getLogger(__name__)
+
+
+class SerialSink:
+    """pyserial 串口"""
+
+    name = 'serial'
+
+    def __init__(self, port, baudrate=9600, init_delay=1.0, ack_timeout=0.5):
+        self.port = port
+        self.baudrate = baudrate
+        # 打开串口后等待开发板复位完成的时间（秒）
+        self.init_delay = init_delay
+        # 等待确认字节的时间（秒）
+        self.ack_timeout = ack_timeout
+        self._serial = None
+
+    def describe(self):
+        return f"serial://{self.port}?baudrate={self.baudrate}"
+
+    def _port_exists(self):
+        """检查端口是否存在（系统串口列表或设备文件，如 pty）"""
+        import serial.tools.list_ports
+        ports = serial.tools.list_ports.comports()
+        logger.debug(f"可用串口列表: {[port.device for port in ports]}")
+        return any(port.device == self.port for port in ports) or os.path.exists(self.port)
+
+    def open(self):
+        try:
+            import serial
+        except ImportError:
+            raise OSError("未安装pyserial库，无法与51开发板通信。请运行 'pip install pyserial' 安装")
+        # 端口扫描只在建立连接时做一次
+        if not self._port_exists():
+            raise OSError(f"端口 {self.port} 不存在")
+        logger.debug(f"尝试连接 {self.port}，波特率 {self.baudrate}")
+        ser = serial.Serial(self.port, self.baudrate, timeout=self.ack_timeout, write_timeout=2)
+        # 打开串口会让开发板复位，只在建立连接时等待一次
+        time.sleep(self.init_delay)
+        ser.reset_input_buffer()
+        self._serial = ser
+
+    def write(self, data):
+        self._serial.write(data)
+
+    def read_ack(self):
+        return self._serial.read(1)
+
+    def close(self):
+        if self._serial is not None:
+            try:
+                self._serial.close()
+            finally:
+                self._serial = None
+
+
+class TcpSink:
+    """TCP连接（串口服务器、网络上的模拟开发板）"""
+
+    name = 'tcp'
+
+    def __init__(self, host, port, ack_timeout=0.5, connect_timeout=3.0):
+        self.host = host
+        self.port = port
+        self.ack_timeout = ack_timeout
+        self.connect_timeout = connect_timeout
+        self._sock = None
+
+    def describe(self):
+        return f"tcp://{self.host}:{self.port}"
+
+    def open(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+        sock.settimeout(self.ack_timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+
+    def write(self, data):
+        self._sock.sendall(data)
+
+    def read_ack(self):
+        try:
+            data = self._sock.recv(1)
+        except socket.timeout:
+            return b''
+        if not data:
+            raise ConnectionError("对端已关闭连接")
+        return data
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+
+class FileSink:
+    """设备文件或普通文件；终端设备（pty）等待确认，普通文件写入即视为确认"""
+
+    name = 'file'
+
+    def __init__(self, path, ack_timeout=0.5, expect_ack=None):
+        self.path = path
+        self.ack_timeout = ack_timeout
+        # None 表示根据是否是终端设备自动判断
+        self.expect_ack = expect_ack
+        self._fd = None
+        self._wait_ack = False
+
+    def describe(self):
+        return f"file://{self.path}"
+
+    def open(self):
+        flags = os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOCTTY', 0)
+        self._fd = os.open(self.path, flags, 0o644)
+        is_tty = os.isatty(self._fd)
+        if is_tty:
+            import tty
+            # 原始模式：不回显、不做换行转换
+            tty.setraw(self._fd)
+        self._wait_ack = is_tty if self.expect_ack is None else self.expect_ack
+
+    def write(self, data):
+        os.write(self._fd, data)
+
+    def read_ack(self):
+        if not self._wait_ack:
+            return b'P'
+        ready, _, _ = select.select([self._fd], [], [], self.ack_timeout)
+        return os.read(self._fd, 1) if ready else b''
+
+    def close(self):
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            finally:
+                self._fd = None
+
+
+class SimulatorSink:
+    """内存中的模拟开发板，可注入确认延迟、丢失确认和断线，用于压测"""
+
+    name = 'sim'
+
+    def __init__(self, latency=0.0, drop=0.0, disconnect=0.0, seed=None):
+        # 确认延迟（秒）
+        self.latency = latency
+        # 每次发送不回复确认的概率
+        self.drop = drop
+        # 每次发送断开连接的概率
+        self.disconnect = disconnect
+        self._random = random.Random(seed)
+        self._connected = False
+        self._last_command = None
+        # 模拟开发板当前显示的完成率
+        self.displayed = None
+
+    def describe(self):
+        return f"sim://?latency={self.latency}&drop={self.drop}&disconnect={self.disconnect}"
+
+    def open(self):
+        self._connected = True
+
+    def write(self, data):
+        if not self._connected:
+            raise ConnectionError("模拟开发板未连接")
+        if self._random.random() < self.disconnect:
+            self._connected = False
+            raise ConnectionError("模拟开发板断开连接")
+        self._last_command = data
+
+    def read_ack(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self._random.random() < self.drop:
+            return b''
+        command = self._last_command.decode().strip()
+        if command.startswith('P'):
+            self.displayed = int(command[1:])
+        return command[:1].encode()
+
+    def close(self):
+        self._connected = False
+
+
+class NullSink:
+    """不连接任何设备，发送立即视为成功"""
+
+    name = 'none'
+
+    def describe(self):
+        return 'none://'
+
+    def open(self):
+        pass
+
+    def write(self, data):
+        pass
+
+    def read_ack(self):
+        return b'P'
+
+    def close(self):
+        pass
+
+
+def create_sink(url, default_baudrate=9600):
+    """根据 BOARD_SINK 地址创建显示设备，格式错误或未知类型时退回 none"""
+    parts = urlsplit(url if '://' in url else f"{url}://")
+    query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+    scheme = parts.scheme.lower()
+    try:
+        if scheme == SerialSink.name:
+            return SerialSink(
+                parts.netloc + parts.path,
+                baudrate=int(query.get('baudrate', default_baudrate)),
+                init_delay=float(query.get('init_delay', 1.0))
+            )
+        if scheme == TcpSink.name:
+            return TcpSink(parts.hostname, parts.port)
+        if scheme == FileSink.name:
+            expect_ack = query.get('ack')
+            return FileSink(
+                parts.netloc + parts.path,
+                expect_ack=None if expect_ack is None else expect_ack not in ('0', 'false')
+            )
+        if scheme == SimulatorSink.name:
+            return SimulatorSink(
+                latency=float(query.get('latency', 0)),
+                drop=float(query.get('drop', 0)),
+                disconnect=float(query.get('disconnect', 0)),
+                seed=int(query['seed']) if 'seed' in query else None
+            )
+        if scheme == NullSink.name:
+            return NullSink()
+    except (TypeError, ValueError) as e:
+        logger.error(f"显示设备配置 {url} 无效: {str(e)}", exc_info=True)
+        return NullSink()
+    logger.warning(f"未知的显示设备类型 {url}，不连接显示设备")
+    return NullSink()
+
+
+class BoardLink:
+    """持久化的显示设备连接，由后台线程负责收发"""
+
+    def __init__(self, sink, reconnect_min=1.0, reconnect_max=30.0, min_interval=0.2, latency_window=100):
+        self.sink = sink
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        # 两次写入的最小间隔（秒）
+        self.min_interval = min_interval
+        self._connected = False
+        self._thread = None
+        self._lock = threading.Lock()
+        # 待发送的最新完成率，由 _cond 保护
+        self._cond = threading.Condition()
+        self._desired = None
+        self._pending = False
+        # 发送状态，供状态接口查看
+        self.last_sent = None
+        self.last_sent_at = None
+        self.last_acked = None
+        self.last_acked_at = None
+        self._counters = collections.Counter()
+        self._latencies = collections.deque(maxlen=latency_window)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='board-link', daemon=True)
+                self._thread.start()
+
+    def submit(self, completion_rate):
+        """提交要显示的完成率，不阻塞；还没发送的旧值会被覆盖"""
+        self.start()
+        completion_rate = max(0, min(100, int(completion_rate)))
+        with self._cond:
+            self._counters['submitted'] += 1
+            if self._pending:
+                self._counters['coalesced'] += 1
+            self._desired = completion_rate
+            self._pending = True
+            self._cond.notify()
+        return True
+
+    def _take(self, block=True):
+        """取出最新的待发送完成率，没有时返回None"""
+        with self._cond:
+            while block and not self._pending:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            self._pending = False
+            return self._desired
+
+    def _requeue(self, completion_rate):
+        """发送失败时放回，除非期间已经有了更新的值；返回是否放回（即会重发）"""
+        with self._cond:
+            if self._pending:
+                return False
+            self._desired = completion_rate
+            self._pending = True
+            return True
+
+    def is_connected(self):
+        return self._connected
+
+    def _connect(self):
+        self.sink.open()
+        self._connected = True
+        # 开发板复位后显示的内容未知，需要重新发送
+        self.last_acked = None
+        logger.info(f"已连接显示设备: {self.sink.describe()}")
+
+    def _disconnect(self):
+        self._connected = False
+        try:
+            self.sink.close()
+        except Exception:
+            pass
+
+    def _send(self, completion_rate):
+        """发送一次完成率并等待确认，返回是否收到确认"""
+        command = f"P{completion_rate}\n"
+        started = time.monotonic()
+        self.sink.write(command.encode())
+        self.last_sent = completion_rate
+        self.last_sent_at = time.time()
+        self._counters['sent'] += 1
+        logger.info(f"已发送完成率数据: {command.strip()}")
+        ack = self.sink.read_ack()
+        elapsed = time.monotonic() - started
+        if ack == b'P':
+            metrics.board_send_seconds.labels('acked').observe(elapsed)
+            self._latencies.append(elapsed)
+            self.last_acked = completion_rate
+            self.last_acked_at = time.time()
+            self._counters['acked'] += 1
+            logger.debug("51开发板已确认")
+            return True
+        # 没有确认时不知道开发板显示的是什么，下次相同的值也要重新发送
+        self.last_acked = None
+        self._counters['unacked'] += 1
+        metrics.board_send_seconds.labels('unacked').observe(elapsed)
+        logger.warning(f"51开发板未确认完成率数据: {ack!r}")
+        return False
+
+    def _run(self):
+        backoff = self.reconnect_min
+        last_write = 0.0
+        while True:
+            completion_rate = self._take()
+            # 限制写入频率，等待期间到达的新值直接覆盖当前值
+            wait = last_write + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+                newer = self._take(block=False)
+                if newer is not None:
+                    completion_rate = newer
+            if completion_rate == self.last_acked:
+                self._counters['deduplicated'] += 1
+                continue
+            try:
+                if not self._connected:
+                    self._connect()
+                last_write = time.monotonic()
+                self._send(completion_rate)
+                backoff = self.reconnect_min
+            except OSError as e:
+                # pyserial 的 SerialException 也是 OSError
+                self._disconnect()
+                self._counters['errors'] += 1
+                if self._requeue(completion_rate):
+                    self._counters['retries'] += 1
+                logger.error(f"显示设备通信异常: {str(e)}，{backoff:.0f} 秒后重连")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.reconnect_max)
+            except Exception as e:
+                self._disconnect()
+                self._counters['errors'] += 1
+                logger.error(f"与51开发板通信过程中发生未预期错误: {str(e)}", exc_info=True)
+
+    def status(self):
+        """连接状态、最近发送/确认的值和发送延迟"""
+        latencies = sorted(self._latencies)
+        with self._cond:
+            pending = self._desired if self._pending else None
+        return {
+            'sink': self.sink.describe(),
+            'connected': self.is_connected(),
+            'pending': pending,
+            'last_sent': self.last_sent,
+            'last_sent_at': self.last_sent_at,
+            'last_acked': self.last_acked,
+            'last_acked_at': self.last_acked_at,
+            'submitted': self._counters['submitted'],
+            'coalesced': self._counters['coalesced'],
+            'deduplicated': self._counters['deduplicated'],
+            'sent': self._counters['sent'],
+            'acked': self._counters['acked'],
+            'unacked': self._counters['unacked'],
+            'errors': self._counters['errors'],
+            'retries': self._counters['retries'],
+            'latency_ms': {
+                'last': round(self._latencies[-1] * 1000, 1) if self._latencies else 0,
+                'avg': round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0,
+                'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1) if latencies else 0
+            }
+        }
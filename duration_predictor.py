@@ -0,0 +1,125 @@
+import logging
+import threading
+
+import numpy as np
+
+from ai_history import VECTOR_DIM, title_vector
+
+'''
+本地任务时长预测
+大多数任务名以前都完成过类似的，用自己的完成历史就能估计时长，不需要调用模型：
+- 历史任务名的 n-gram 向量放在一个 NumPy 矩阵里，预测时一次矩阵乘法得到和所有历史任务的相似度
+- 取最相似的 k 个任务，按相似度加权平均它们的实际用时（没有记录实际用时的用计划时长）
+- 置信度由最高相似度、相似任务数量和它们用时的离散程度决定，置信度不够时返回None，由调用方交给模型
+'''
+
+logger = logging.getLogger(__name__)
+
+
+def record_target(record):
+    """历史记录的目标时长：优先实际用时，其次用户设置的时长，都没有时返回None"""
+    actual = record.get('actual_time')
+    if actual:
+        return float(actual)
+    duration = record.get('duration')
+    return float(duration) if duration else None
+
+
+class DurationPredictor:
+    """基于历史任务名最近邻的本地时长预测"""
+
+    def __init__(self, k=5, min_similarity=0.5, min_confidence=0.75):
+        self.k = k
+        # 低于这个相似度的历史任务不参与预测
+        self.min_similarity = min_similarity
+        # 置信度达到这个值才直接使用本地预测
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((64, VECTOR_DIM), dtype=np.float32)
+        self._targets = np.zeros(64, dtype=np.float64)
+        self._size = 0
+        self.predictions = 0
+        self.confident = 0
+
+    def load(self, records):
+        """用历史记录批量建立索引"""
+        pairs = [(record['title'], record_target(record)) for record in records]
+        pairs = [(title, target) for title, target in pairs if target]
+        with self._lock:
+            self._size = 0
+            self._reserve(len(pairs))
+            if pairs:
+                self._vectors[:len(pairs)] = np.stack([title_vector(title) for title, _ in pairs])
+                self._targets[:len(pairs)] = [target for _, target in pairs]
+            self._size = len(pairs)
+        logger.info(f"本地时长预测已加载 {self._size} 条历史任务")
+
+    def _reserve(self, size):
+        """容量不够时按倍数扩容（调用方持有锁）"""
+        capacity = len(self._targets)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        vectors = np.zeros((capacity, VECTOR_DIM), dtype=np.float32)
+        targets = np.zeros(capacity, dtype=np.float64)
+        vectors[:self._size] = self._vectors[:self._size]
+        targets[:self._size] = self._targets[:self._size]
+        self._vectors, self._targets = vectors, targets
+
+    def add(self, record):
+        """加入一条新的完成记录"""
+        target = record_target(record)
+        if not target:
+            return
+        vector = title_vector(record['title'])
+        with self._lock:
+            self._reserve(self._size + 1)
+            self._vectors[self._size] = vector
+            self._targets[self._size] = target
+            self._size += 1
+
+    def predict(self, title, min_confidence=None):
+        """返回 (预测分钟数, 置信度)，置信度不够时预测分钟数为None
+
+        min_confidence 可以临时放宽置信度要求（AI服务不可用、需要兜底估计时使用）
+        """
+        if min_confidence is None:
+            min_confidence = self.min_confidence
+        vector = title_vector(title)
+        with self._lock:
+            size = self._size
+            if not size or not vector.any():
+                return None, 0.0
+            similarities = self._vectors[:size] @ vector
+            targets = self._targets[:size]
+            # 计数与 add() 一样在锁内修改，并发预测时不会丢失
+            self.predictions += 1
+        k = min(self.k, size)
+        nearest = np.argpartition(-similarities, k - 1)[:k]
+        nearest = nearest[similarities[nearest] >= self.min_similarity]
+        if not len(nearest):
+            return None, 0.0
+
+        weights = similarities[nearest]
+        values = targets[nearest]
+        prediction = float(np.average(values, weights=weights))
+        # 只有一个相似任务时打折扣；相似任务的用时差别越大，置信度越低
+        confidence = float(weights.max()) * (1.0 if len(nearest) > 1 else 0.8)
+        if len(nearest) > 1:
+            spread = float(np.sqrt(np.average((values - prediction) ** 2, weights=weights))) / prediction
+            confidence *= 1 - min(spread, 1.0) * 0.5
+        if confidence < min_confidence:
+            return None, confidence
+        if confidence >= self.min_confidence:
+            with self._lock:
+                self.confident += 1
+        return max(1, int(round(prediction))), confidence
+
+    def stats(self):
+        with self._lock:
+            return {
+                'history_size': self._size,
+                'predictions': self.predictions,
+                'confident': self.confident
+            }
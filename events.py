@@ -0,0 +1,257 @@
+import asyncio
+import itertools
+import json
+import logging
+import queue
+import threading
+
+'''
+服务器推送事件（SSE）
+后端把任务变化、完成率变化和计时刷新推送给所有打开的页面，代替浏览器每秒轮询：
+- 每个连接只有一个事件队列，没有事件时阻塞在队列上（不是循环 sleep）
+- 计时刷新由一个公共的 ticker 线程每秒生成一次，再分发给所有连接，
+  与连接数无关
+- 客户端处理太慢、队列满了时直接断开，由浏览器自动重连，不拖慢其他连接
+- 订阅时可以指定主题（任务清单ID），带主题的事件只发给订阅了该主题的连接
+- ASGI 入口的连接用 asyncio 队列（AsyncSubscriber），发布线程通过 call_soon_threadsafe 交给事件循环，
+  每个连接不需要一个线程
+- 多线程（Flask）入口的每个连接仍然占用一个服务线程，所以这类连接有数量上限（max_threaded），
+  超过时拒绝订阅，页面退回轮询；需要大量长连接时请使用 ASGI 入口
+'''
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriberLimitError(Exception):
+    """占用线程的连接数已达到上限"""
+
+
+def format_sse(event, data, event_id=None):
+    """把事件格式化为 text/event-stream 文本"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscriber:
+    """一个SSE连接的事件队列"""
+
+    def __init__(self, max_queue, topic=None):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.topic = topic
+        self.closed = False
+
+
+class AsyncSubscriber:
+    """asyncio 连接的事件队列，put_nowait 可以在任意线程调用"""
+
+    def __init__(self, max_queue, loop, topic=None):
+        self.loop = loop
+        self.max_queue = max_queue
+        self.topic = topic
+        # 与 Subscriber.queue 相同的 put_nowait 接口
+        self.queue = self
+        self.closed = False
+        self._queue = asyncio.Queue()
+
+    def put_nowait(self, message):
+        # qsize 在其他线程读取只是近似值，足够判断客户端是否跟不上
+        if self._queue.qsize() >= self.max_queue:
+            raise queue.Full
+        self.loop.call_soon_threadsafe(self._queue.put_nowait, message)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+
+class EventBroker:
+    """事件分发器，负责订阅管理、广播和公共 ticker"""
+
+    def __init__(self, max_queue=256, heartbeat=15, max_threaded=None):
+        self.max_queue = max_queue
+        # 没有事件时发送注释行的间隔（秒），用于保活和及时发现断开的连接
+        self.heartbeat = heartbeat
+        # 占用线程的连接（subscribe，非 asyncio）数量上限，None 为不限
+        self.max_threaded = max_threaded
+        self._threaded = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._ticker = None
+
+    def subscribe(self, topic=None):
+        """订阅（多线程入口使用），占用线程的连接数已达上限时抛出 SubscriberLimitError"""
+        subscriber = Subscriber(self.max_queue, topic)
+        with self._lock:
+            if self.max_threaded is not None and self._threaded >= self.max_threaded:
+                raise SubscriberLimitError(f'事件连接数已达到上限{self.max_threaded}个')
+            self._threaded += 1
+            self._subscribers.add(subscriber)
+        logger.info(f"新的事件订阅，当前连接数: {len(self._subscribers)}")
+        return subscriber
+
+    def subscribe_async(self, topic=None):
+        """在事件循环中订阅（ASGI 入口使用），配合 stream_async"""
+        subscriber = AsyncSubscriber(self.max_queue, asyncio.get_running_loop(), topic)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        logger.info(f"新的事件订阅，当前连接数: {len(self._subscribers)}")
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscriber.closed = True
+        with self._lock:
+            # 队列满时断开和连接结束都会调用，只计数一次
+            if subscriber in self._subscribers:
+                self._subscribers.discard(subscriber)
+                if isinstance(subscriber, Subscriber):
+                    self._threaded -= 1
+        logger.info(f"事件订阅已断开，当前连接数: {len(self._subscribers)}")
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, event, data, topic=None):
+        """广播事件（指定 topic 时只发给订阅了该主题的连接），没有订阅者时几乎没有开销"""
+        if not self._subscribers:
+            return
+        with self._lock:
+            subscribers = [s for s in self._subscribers if topic is None or s.topic == topic]
+        if not subscribers:
+            return
+        message = format_sse(event, data, next(self._ids))
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(message)
+            except queue.Full:
+                # 客户端跟不上，断开它，让浏览器重连后重新拿最新状态
+                logger.warning("事件队列已满，断开处理过慢的连接")
+                self.unsubscribe(subscriber)
+
+    def stream(self, subscriber):
+        """SSE响应体生成器，连接断开时自动取消订阅"""
+        try:
+            # 告诉浏览器断线后多久重连（毫秒）
+            yield 'retry: 3000\n\n'
+            while not subscriber.closed:
+                try:
+                    message = subscriber.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+    async def stream_async(self, subscriber):
+        """stream 的异步生成器版本"""
+        try:
+            yield 'retry: 3000\n\n'
+            while not subscriber.closed:
+                try:
+                    message = await subscriber.get(self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+    def start_ticker(self, interval, producer):
+        """启动公共 ticker：每隔 interval 秒调用 producer()，返回 [(事件名, 数据, 主题), ...] 或 None"""
+        if self._ticker is not None:
+            return
+
+        def run():
+            stop = threading.Event()
+            while not stop.wait(interval):
+                if not self._subscribers:
+                    continue
+                try:
+                    result = producer()
+                except Exception as e:
+                    logger.error(f"生成定时事件失败: {str(e)}", exc_info=True)
+                    continue
+                for item in result or ():
+                    self.publish(*item)
+
+        self._ticker = threading.Thread(target=run, name='event-ticker', daemon=True)
+        self._ticker.start()
+
+
+class StreamBuffer:
+    """正在生成的文本（如流式AI回复），任意数量的读者都可以从头跟读到结束"""
+
+    def __init__(self):
+        self._chunks = []
+        self._closed = False
+        self._cond = threading.Condition()
+        # 异步读者：(事件循环, asyncio.Event)
+        self._async_waiters = set()
+
+    def _notify(self):
+        """唤醒所有读者（调用方持有 _cond）"""
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def append(self, text):
+        with self._cond:
+            self._chunks.append(text)
+            self._notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._notify()
+
+    def text(self):
+        with self._cond:
+            return ''.join(self._chunks)
+
+    def follow(self, timeout=15):
+        """依次产出已有和新到的文本片段，直到结束；timeout 秒内没有新内容时产出None（用于保活）"""
+        index = 0
+        while True:
+            with self._cond:
+                if index >= len(self._chunks) and not self._closed:
+                    self._cond.wait(timeout)
+                chunks = self._chunks[index:]
+                index += len(chunks)
+                closed = self._closed
+            if chunks:
+                yield ''.join(chunks)
+            elif not closed:
+                yield None
+            if closed and index >= len(self._chunks):
+                return
+
+    async def follow_async(self, timeout=15):
+        """follow 的异步生成器版本，等待新内容时不占用线程"""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            self._async_waiters.add(waiter)
+        try:
+            index = 0
+            while True:
+                # 先清除再读取，读取之后追加的内容一定会再次唤醒
+                waiter[1].clear()
+                with self._cond:
+                    chunks = self._chunks[index:]
+                    index += len(chunks)
+                    closed = self._closed
+                if chunks:
+                    yield ''.join(chunks)
+                    continue
+                if closed:
+                    return
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
@@ -0,0 +1,280 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+import weakref
+
+'''
+进程内的监控指标，/metrics 以 Prometheus 文本格式（0.0.4）输出
+- 计数器和直方图按线程分片：每个线程只修改自己的那一份，不加锁也不会丢失更新，抓取时再汇总，
+  记录一次只是几次列表元素加法，可以在生产环境一直开启；
+  线程结束时它的分片并入已结束线程的汇总值后删除，分片数只与存活的线程数有关（Flask 每个请求一个线程）
+- 当前值类的指标（计时数、线程数、队列长度等）注册为回调，抓取时才读取，平时没有开销
+'''
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 默认的延迟直方图分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _ShardHolder:
+    """放在线程局部变量中的分片，线程结束时被回收"""
+
+    __slots__ = ('shard', '__weakref__')
+
+
+class _Shards:
+    """按线程分片的一组数值，写入只修改当前线程的分片"""
+
+    def __init__(self, size):
+        self._size = size
+        self._local = threading.local()
+        # 存活线程的分片，以及已结束线程的分片之和；只在新建/回收分片和抓取时加锁
+        self._shards = {}
+        self._retired = [0] * size
+        self._lock = threading.Lock()
+
+    def local(self):
+        try:
+            return self._local.holder.shard
+        except AttributeError:
+            return self._new_shard()
+
+    def _new_shard(self):
+        holder = _ShardHolder()
+        holder.shard = [0] * self._size
+        key = id(holder)
+        with self._lock:
+            self._shards[key] = holder.shard
+        # 线程结束时线程局部变量被清理，holder 随之回收，此后不会再有写入
+        weakref.finalize(holder, self._retire, key)
+        self._local.holder = holder
+        return holder.shard
+
+    def _retire(self, key):
+        with self._lock:
+            shard = self._shards.pop(key, None)
+            if shard is not None:
+                for position, value in enumerate(shard):
+                    self._retired[position] += value
+
+    def totals(self):
+        with self._lock:
+            totals = list(self._retired)
+            for shard in self._shards.values():
+                for position, value in enumerate(shard):
+                    totals[position] += value
+        return totals
+
+
+class _CounterChild:
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount=1):
+        self._shards.local()[0] += amount
+
+    def samples(self):
+        yield '', {}, self._shards.totals()[0]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._buckets = buckets
+        # 每个分桶的计数、+Inf 分桶的计数、总和
+        self._shards = _Shards(len(buckets) + 2)
+
+    def observe(self, value):
+        shard = self._shards.local()
+        shard[bisect.bisect_left(self._buckets, value)] += 1
+        shard[-1] += value
+
+    def samples(self):
+        totals = self._shards.totals()
+        cumulative = 0
+        for bound, count in zip(self._buckets + (float('inf'),), totals):
+            cumulative += count
+            yield '_bucket', {'le': format_value(bound)}, cumulative
+        yield '_sum', {}, totals[-1]
+        yield '_count', {}, cumulative
+
+
+class _Metric:
+    """带标签的指标，每组标签值一个子指标"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames) if labels else values
+        child = self._children.get(key)
+        if child is None:
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, key))
+            for suffix, extra, value in child.samples():
+                yield self.name + suffix, dict(labels, **extra), value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class CallbackMetric:
+    """抓取时调用 func 取值：返回一个数值，或 [(标签值元组, 数值)]"""
+
+    def __init__(self, name, documentation, kind, func, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.func = func
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        result = self.func()
+        if not self.labelnames:
+            yield self.name, {}, result
+            return
+        for values, value in result:
+            yield self.name, dict(zip(self.labelnames, values)), value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, func, kind='gauge', labelnames=()):
+        return self.register(CallbackMetric(name, documentation, kind, func, labelnames))
+
+    def render(self):
+        """所有指标的 Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                logger.error(f"读取指标 {metric.name} 失败: {str(e)}", exc_info=True)
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), chr(92) + "n")}"'
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return str(value)
+
+
+def dict_samples(values, keys):
+    """把状态字典中的几项转换为回调指标的 [(标签值元组, 数值)]，每项一个标签值"""
+    return [((key,), values[key]) for key in keys]
+
+
+def timed(histogram, **labels):
+    """装饰器：把函数的执行时间记录到直方图"""
+    def decorator(func):
+        child = histogram.labels(**labels)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+# ============ 进程内共用的指标 ============
+
+registry = Registry()
+
+http_requests = registry.counter(
+    'todolist_http_requests_total', '按路由、方法和状态码统计的请求数', ('method', 'route', 'status'))
+http_request_seconds = registry.histogram(
+    'todolist_http_request_duration_seconds', '请求处理时间（流式响应到开始返回为止）', ('method', 'route'))
+
+storage_seconds = registry.histogram(
+    'todolist_storage_operation_seconds', '任务仓库读写次数和耗时（write 为写盘）', ('store', 'operation'),
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+
+ai_request_seconds = registry.histogram(
+    'todolist_ai_request_seconds', 'AI请求耗时（包括重试，流式请求到开始返回为止）', ('stream', 'outcome'))
+ai_tokens = registry.counter('todolist_ai_tokens_total', 'AI请求消耗的token数', ('type',))
+ai_errors = registry.counter('todolist_ai_errors_total', 'AI请求失败次数（按异常类型）', ('error',))
+
+board_send_seconds = registry.histogram(
+    'todolist_board_send_seconds', '向显示设备发送完成率到收到确认（或超时）的时间', ('result',))
+
+
+def observe_request(method, route, status, seconds):
+    """记录一次HTTP请求（route 是路由规则，如 /toggle-task/<int:task_id>，不是实际路径）"""
+    http_requests.labels(method, route, str(status)).inc()
+    http_request_seconds.labels(method, route).observe(seconds)
@@ -0,0 +1,374 @@
+import contextlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+
+import metrics
+from task_store import SORT_FIELDS, JournalBackend, decode_cursor, encode_cursor
+
+'''
+SQLite 任务仓库
+与 TaskStore 提供相同的接口，通过环境变量 TASKS_BACKEND=sqlite 启用：
+- 任务ID是主键，单个任务的读写都是主键查找
+- 任务总数和完成数量在启动时统计一次（completed 字段建有索引），之后随每次修改增量维护
+- 分页查询走索引：标题（不区分大小写）、时长、计时状态都建有索引，翻页用游标（键集分页），不用 OFFSET
+- 使用 WAL 模式，连接放在固定大小的连接池中，每次操作借出一个、用完归还，连接数与线程数无关
+- 第一次启动时自动导入现有的 tasks.json（包括 journal 后端留下的日志）
+'''
+
+logger = logging.getLogger(__name__)
+
+# 有独立列的字段，其余字段以JSON形式保存在 extra 列中
+COLUMNS = ('title', 'completed', 'duration', 'is_timing', 'time_remaining', 'ai_duration')
+BOOL_COLUMNS = ('completed', 'is_timing')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    duration INTEGER NOT NULL DEFAULT 0,
+    is_timing INTEGER NOT NULL DEFAULT 0,
+    time_remaining REAL NOT NULL DEFAULT 0,
+    ai_duration INTEGER NOT NULL DEFAULT 0,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_completed ON tasks(completed);
+CREATE INDEX IF NOT EXISTS idx_tasks_title ON tasks(title COLLATE NOCASE, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_duration ON tasks(duration, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_timing ON tasks(is_timing);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# 分页查询的排序表达式，与建立的索引一致
+SORT_EXPRESSIONS = {'id': 'id', 'title': 'title COLLATE NOCASE', 'duration': 'duration'}
+
+
+def _split_fields(fields):
+    """把任务字段拆成 (列字段, 额外字段)"""
+    columns = {}
+    extra = {}
+    for key, value in fields.items():
+        if key == 'id':
+            continue
+        if key in COLUMNS:
+            columns[key] = int(bool(value)) if key in BOOL_COLUMNS else value
+        else:
+            extra[key] = value
+    return columns, extra
+
+
+def _row_to_task(row):
+    task = {'id': row['id']}
+    for key in COLUMNS:
+        value = row[key]
+        task[key] = bool(value) if key in BOOL_COLUMNS else value
+    # time_remaining 以REAL保存，整数值还原成int，保持与JSON文件一致
+    if isinstance(task['time_remaining'], float) and task['time_remaining'].is_integer():
+        task['time_remaining'] = int(task['time_remaining'])
+    task.update(json.loads(row['extra'] or '{}'))
+    return task
+
+
+class SqliteTaskStore:
+    """基于SQLite的任务仓库，接口与 TaskStore 相同"""
+
+    def __init__(self, db_path, import_path=None, default_tasks=None, pool_size=8):
+        self.path = db_path
+        # 首次启动时要导入的旧任务文件
+        self.import_path = import_path
+        self.default_tasks = default_tasks or []
+        # 路由里的“读-改-写”仍然用这把锁串行化，和 TaskStore 一致
+        self.lock = threading.RLock()
+        # 当前线程借出的连接（嵌套使用时复用）和是否在 batch() 中
+        self._local = threading.local()
+        # 连接池：最多 pool_size 个连接，用到时才创建
+        self.pool_size = max(1, pool_size)
+        self._pool = queue.LifoQueue()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        # 任务总数和已完成数，在 self.lock 内随修改增量维护
+        self._total = 0
+        self._completed = 0
+
+    # ============ 连接管理 ============
+
+    def _open_connection(self):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _checkout(self):
+        """从连接池借出一个连接；没有空闲连接时，未达到上限就新建，否则等待归还"""
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._connections_lock:
+            if len(self._connections) < self.pool_size:
+                conn = self._open_connection()
+                self._connections.append(conn)
+                return conn
+        return self._pool.get()
+
+    @contextlib.contextmanager
+    def _connection(self):
+        """借出一个连接，用完归还；同一线程嵌套使用（如 batch() 中的修改）时复用已借出的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self._checkout()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+
+    # ============ 加载与写盘 ============
+
+    def load(self):
+        """建表，并在第一次启动时导入旧的任务文件"""
+        with self._connection() as conn, conn:
+            conn.executescript(SCHEMA)
+            imported = conn.execute("SELECT value FROM meta WHERE key = 'imported'").fetchone()
+            if imported is None:
+                tasks = self._read_import_file()
+                source = self.import_path
+                if tasks is None:
+                    tasks = self.default_tasks
+                    source = 'defaults'
+                for task in tasks:
+                    self._insert(conn, task)
+                conn.execute("INSERT INTO meta (key, value) VALUES ('imported', ?)", (source,))
+                logger.info(f"已从 {source} 导入 {len(tasks)} 个任务到 {self.path}")
+            self._recount(conn)
+        logger.info(f"成功加载任务数据库 {self.path}，共 {len(self)} 个任务")
+        return self.list_tasks()
+
+    def _recount(self, conn):
+        with self.lock:
+            self._total = conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+            self._completed = conn.execute('SELECT COUNT(*) FROM tasks WHERE completed = 1').fetchone()[0]
+
+    def _read_import_file(self):
+        """读取旧的 tasks.json（含未压缩的日志），不存在时返回None"""
+        if not self.import_path:
+            return None
+        backend = JournalBackend(self.import_path)
+        try:
+            tasks = backend.load()
+        except Exception as e:
+            logger.error(f"读取旧任务文件失败: {str(e)}", exc_info=True)
+            return None
+        finally:
+            backend.close()
+        # 只读导入时不需要留下新建的空日志文件
+        if os.path.exists(backend.journal_path) and os.path.getsize(backend.journal_path) == 0:
+            os.remove(backend.journal_path)
+        if tasks is not None:
+            for task in tasks:
+                task.setdefault('ai_duration', 0)
+        return tasks
+
+    def flush(self, compact=False):
+        """每次修改都已在事务中提交，这里只在压缩时做一次WAL检查点"""
+        if compact:
+            with self._connection() as conn:
+                conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+        return False
+
+    def close(self):
+        """关闭连接池中的所有连接"""
+        try:
+            self.flush(compact=True)
+        except Exception as e:
+            logger.error(f"关闭任务数据库时检查点失败: {str(e)}", exc_info=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._connections.clear()
+
+    # ============ 读操作 ============
+
+    @metrics.timed(metrics.storage_seconds, store='sqlite', operation='query')
+    def query(self, completed=None, is_timing=None, title_prefix=None, sort='id', descending=False,
+              cursor=None, limit=50):
+        """分页查询任务，参数和返回值与 TaskStore.query 相同"""
+        if sort not in SORT_FIELDS:
+            raise ValueError(f'不支持的排序字段: {sort}')
+        conditions, params = [], []
+        if completed is not None:
+            conditions.append(f'completed = {int(completed)}')
+        if is_timing is not None:
+            conditions.append(f'is_timing = {int(is_timing)}')
+        if title_prefix:
+            # LIKE 不区分（ASCII）大小写，可以使用 NOCASE 的标题索引
+            escaped = title_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            conditions.append("title LIKE ? ESCAPE '\\'")
+            params.append(escaped + '%')
+        expression = SORT_EXPRESSIONS[sort]
+        if cursor:
+            key, task_id = decode_cursor(cursor, sort, descending)
+            if sort == 'id':
+                conditions.append(f"id {'<' if descending else '>'} ?")
+                params.append(task_id)
+            else:
+                # 单独的首列条件让 SQLite 从索引中的游标位置开始查找，而不是扫描整个索引
+                conditions.append(f"{expression} {'<=' if descending else '>='} ?")
+                conditions.append(f"({expression}, id) {'<' if descending else '>'} (?, ?)")
+                params.extend([key, key, task_id])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        direction = 'DESC' if descending else 'ASC'
+        order = f'id {direction}' if sort == 'id' else f'{expression} {direction}, id {direction}'
+        with self._connection() as conn:
+            rows = conn.execute(
+                f'SELECT * FROM tasks {where} ORDER BY {order} LIMIT ?', [*params, limit + 1]
+            ).fetchall()
+        tasks = [_row_to_task(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit and tasks:
+            last = tasks[-1]
+            next_cursor = encode_cursor(sort, descending, last[sort], last['id'])
+        return tasks, next_cursor
+
+    @metrics.timed(metrics.storage_seconds, store='sqlite', operation='list_tasks')
+    def list_tasks(self):
+        """返回所有任务，按ID顺序排列"""
+        with self._connection() as conn:
+            rows = conn.execute('SELECT * FROM tasks ORDER BY id').fetchall()
+        return [_row_to_task(row) for row in rows]
+
+    @metrics.timed(metrics.storage_seconds, store='sqlite', operation='get')
+    def get(self, task_id):
+        """按主键获取任务，不存在时返回None"""
+        with self._connection() as conn:
+            row = conn.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        return _row_to_task(row) if row else None
+
+    def __len__(self):
+        return self._total
+
+    def __contains__(self, task_id):
+        with self._connection() as conn:
+            return conn.execute('SELECT 1 FROM tasks WHERE id = ?', (task_id,)).fetchone() is not None
+
+    def count_completed(self):
+        """已完成的任务数量（增量维护的计数，O(1)）"""
+        return self._completed
+
+    def counts(self):
+        """同一时刻的 (任务总数, 已完成数)"""
+        with self.lock:
+            return self._total, self._completed
+
+    # ============ 写操作 ============
+
+    @contextlib.contextmanager
+    def _transaction(self, conn):
+        """单个修改的事务；在 batch() 中时并入整批的事务"""
+        if getattr(self._local, 'in_batch', False):
+            yield conn
+        else:
+            with conn:
+                yield conn
+
+    @contextlib.contextmanager
+    def batch(self):
+        """在一次加锁和一个事务内执行多个修改，出错时整批回滚"""
+        with self.lock, self._connection() as conn:
+            if getattr(self._local, 'in_batch', False):
+                yield self
+                return
+            self._local.in_batch = True
+            try:
+                with conn:
+                    yield self
+            except Exception:
+                # 事务已回滚，计数以数据库为准
+                self._recount(conn)
+                raise
+            finally:
+                self._local.in_batch = False
+
+    def _insert(self, conn, fields):
+        columns, extra = _split_fields(fields)
+        names = list(columns)
+        values = [columns[name] for name in names]
+        if 'id' in fields:
+            names.insert(0, 'id')
+            values.insert(0, fields['id'])
+        names.append('extra')
+        values.append(json.dumps(extra, ensure_ascii=False))
+        cursor = conn.execute(
+            f"INSERT INTO tasks ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+            values
+        )
+        return cursor.lastrowid
+
+    @metrics.timed(metrics.storage_seconds, store='sqlite', operation='add')
+    def add(self, fields):
+        """添加新任务并分配ID，返回新任务"""
+        with self.lock, self._connection() as conn:
+            with self._transaction(conn):
+                task_id = self._insert(conn, {k: v for k, v in fields.items() if k != 'id'})
+            self._total += 1
+            self._completed += bool(fields.get('completed'))
+        return self.get(task_id)
+
+    @metrics.timed(metrics.storage_seconds, store='sqlite', operation='add_many')
+    def add_many(self, fields_list):
+        """在一个事务中批量添加任务，返回新任务列表"""
+        with self.lock, self._connection() as conn:
+            with self._transaction(conn):
+                task_ids = [self._insert(conn, {k: v for k, v in fields.items() if k != 'id'}) for fields in fields_list]
+            self._total += len(task_ids)
+            self._completed += sum(bool(fields.get('completed')) for fields in fields_list)
+        return [self.get(task_id) for task_id in task_ids]
+
+    @metrics.timed(metrics.storage_seconds, store='sqlite', operation='update')
+    def update(self, task_id, changes, op='update'):
+        """按主键更新任务字段，返回更新后的任务，不存在时返回None"""
+        columns, extra = _split_fields(changes)
+        with self.lock, self._connection() as conn:
+            with self._transaction(conn):
+                row = conn.execute('SELECT completed, extra FROM tasks WHERE id = ?', (task_id,)).fetchone()
+                if row is None:
+                    return None
+                if extra:
+                    merged = json.loads(row['extra'] or '{}')
+                    merged.update(extra)
+                    columns['extra'] = json.dumps(merged, ensure_ascii=False)
+                if columns:
+                    assignments = ', '.join(f"{name} = ?" for name in columns)
+                    conn.execute(f"UPDATE tasks SET {assignments} WHERE id = ?", [*columns.values(), task_id])
+            if 'completed' in columns:
+                self._completed += columns['completed'] - row['completed']
+        logger.debug(f"任务 {task_id} 已更新（{op}）: {changes}")
+        return self.get(task_id)
+
+    @metrics.timed(metrics.storage_seconds, store='sqlite', operation='delete')
+    def delete(self, task_id):
+        """按主键删除任务，返回被删除的任务，不存在时返回None"""
+        with self.lock, self._connection() as conn:
+            task = self.get(task_id)
+            if task is not None:
+                with self._transaction(conn):
+                    conn.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+                self._total -= 1
+                self._completed -= bool(task['completed'])
+        return task
@@ -1,18 +1,10 @@
 document.addEventListener('DOMContentLoaded', function() {
+    // 当前任务清单的接口前缀（默认清单为空，其他清单为 /lists/<清单ID>）
+    const API_BASE = document.body.dataset.apiBase || '';
+
     // 计时器存储对象
     // const timers = {};
     
-    // 获取所有任务复选框
-    const taskCheckboxes = document.querySelectorAll('.task-checkbox');
-    
-    // 为每个复选框添加点击事件监听器
-    taskCheckboxes.forEach(checkbox => {
-        checkbox.addEventListener('change', function() {
-            const taskId = parseInt(this.getAttribute('data-id'));
-            toggleTaskStatus(taskId, this);
-        });
-    });
-    
     // 添加新任务按钮事件
     const addTaskBtn = document.getElementById('addTaskBtn');
     const addTaskModal = document.getElementById('addTaskModal');
@@ -49,29 +41,156 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
     
-    // 删除任务按钮事件
-    const deleteBtns = document.querySelectorAll('.delete-btn');
-    deleteBtns.forEach(btn => {
-        btn.addEventListener('click', function() {
-            const taskId = parseInt(this.getAttribute('data-id'));
-            deleteTask(taskId);
-        });
-    });
-    
-    // 重命名任务按钮事件
-    const renameBtns = document.querySelectorAll('.rename-btn');
     const renameTaskModal = document.getElementById('renameTaskModal');
     const confirmRenameTaskBtn = document.getElementById('confirmRenameTask');
     let currentRenameTaskId = null;
     
-    renameBtns.forEach(btn => {
-        btn.addEventListener('click', function() {
-            currentRenameTaskId = parseInt(this.getAttribute('data-id'));
-            const taskTitle = document.querySelector(`.task-title[data-id="${currentRenameTaskId}"]`).textContent;
-            document.getElementById('renameTaskTitle').value = taskTitle;
-            renameTaskModal.style.display = 'block';
+    // 为 root 中的任务项绑定事件（页面上的任务和之后分页加载的任务都用这个函数）
+    function bindTaskControls(root) {
+        // 为每个复选框添加点击事件监听器
+        root.querySelectorAll('.task-checkbox').forEach(checkbox => {
+            checkbox.addEventListener('change', function() {
+                const taskId = parseInt(this.getAttribute('data-id'));
+                toggleTaskStatus(taskId, this);
+            });
         });
-    });
+        
+        // 删除任务按钮事件
+        root.querySelectorAll('.delete-btn').forEach(btn => {
+            btn.addEventListener('click', function() {
+                const taskId = parseInt(this.getAttribute('data-id'));
+                deleteTask(taskId);
+            });
+        });
+        
+        // 重命名任务按钮事件
+        root.querySelectorAll('.rename-btn').forEach(btn => {
+            btn.addEventListener('click', function() {
+                currentRenameTaskId = parseInt(this.getAttribute('data-id'));
+                const taskTitle = document.querySelector(`.task-title[data-id="${currentRenameTaskId}"]`).textContent;
+                document.getElementById('renameTaskTitle').value = taskTitle;
+                renameTaskModal.style.display = 'block';
+            });
+        });
+        
+        // 修改任务时长事件
+        root.querySelectorAll('.duration-input').forEach(input => {
+            input.addEventListener('change', function() {
+                const taskId = parseInt(this.getAttribute('data-id'));
+                const duration = parseInt(this.value) || 0;
+                updateTaskDuration(taskId, duration);
+            });
+        });
+        
+        // 开始/暂停计时按钮事件
+        root.querySelectorAll('.start-timer-btn').forEach(btn => {
+            btn.addEventListener('click', function() {
+                const taskId = parseInt(this.getAttribute('data-id'));
+                toggleTaskTimer(taskId, this);
+            });
+        });
+    }
+    
+    bindTaskControls(document);
+    
+    // ============ 分页加载其余任务 ============
+    const loadMoreTasks = document.getElementById('loadMoreTasks');
+    let loadingTasks = false;
+    
+    // 与模板中的任务项结构相同
+    function createTaskItem(task) {
+        const item = document.createElement('li');
+        item.className = 'task-item';
+        item.classList.toggle('completed', task.completed);
+        item.classList.toggle('timing', task.is_timing);
+        
+        const checkbox = document.createElement('input');
+        checkbox.type = 'checkbox';
+        checkbox.className = 'task-checkbox';
+        checkbox.dataset.id = task.id;
+        checkbox.checked = task.completed;
+        
+        const title = document.createElement('span');
+        title.className = 'task-title';
+        title.dataset.id = task.id;
+        title.textContent = task.title;
+        
+        const controls = document.createElement('div');
+        controls.className = 'task-controls';
+        const durationInput = document.createElement('input');
+        durationInput.type = 'number';
+        durationInput.className = 'duration-input';
+        durationInput.dataset.id = task.id;
+        durationInput.value = task.duration;
+        durationInput.min = 0;
+        const timerDisplay = document.createElement('span');
+        timerDisplay.className = 'timer-display';
+        timerDisplay.dataset.id = task.id;
+        controls.appendChild(durationInput);
+        controls.appendChild(timerDisplay);
+        [['start-timer-btn', task.is_timing ? '暂停' : '开始'], ['rename-btn', '重命名'], ['delete-btn', '删除']].forEach(([className, text]) => {
+            const button = document.createElement('button');
+            button.className = className;
+            button.dataset.id = task.id;
+            button.textContent = text;
+            controls.appendChild(button);
+        });
+        
+        item.appendChild(checkbox);
+        item.appendChild(title);
+        item.appendChild(controls);
+        return item;
+    }
+    
+    function loadNextPage() {
+        const cursor = loadMoreTasks.dataset.nextCursor;
+        if (loadingTasks || !cursor) {
+            return;
+        }
+        loadingTasks = true;
+        const params = new URLSearchParams({ cursor, limit: loadMoreTasks.dataset.pageSize });
+        fetch(`${API_BASE}/tasks?${params}`)
+            .then(response => response.json())
+            .then(data => {
+                const list = document.querySelector('.tasks-list');
+                data.tasks.forEach(task => {
+                    // 跳过已经在页面上的任务（如通过事件推送加入的）
+                    if (document.querySelector(`.task-checkbox[data-id="${task.id}"]`)) {
+                        return;
+                    }
+                    const item = createTaskItem(task);
+                    list.appendChild(item);
+                    bindTaskControls(item);
+                    renderTimer(task.id, task.time_remaining);
+                });
+                loadMoreTasks.dataset.nextCursor = data.next_cursor || '';
+                if (!data.next_cursor) {
+                    loadMoreTasks.remove();
+                }
+            })
+            .catch(error => console.error('加载任务失败:', error))
+            .finally(() => {
+                loadingTasks = false;
+            });
+    }
+    
+    // 所有任务都已加载（没有下一页）
+    function allTasksLoaded() {
+        return !document.body.contains(loadMoreTasks);
+    }
+    
+    if (loadMoreTasks) {
+        if (window.IntersectionObserver) {
+            new IntersectionObserver(entries => {
+                if (entries.some(entry => entry.isIntersecting)) {
+                    loadNextPage();
+                }
+            }, { rootMargin: '200px' }).observe(loadMoreTasks);
+        } else {
+            loadMoreTasks.textContent = '加载更多';
+            loadMoreTasks.addEventListener('click', loadNextPage);
+        }
+    }
     
     // 确认重命名任务
     confirmRenameTaskBtn.addEventListener('click', function() {
@@ -82,25 +201,6 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
     
-    // 修改任务时长事件
-    const durationInputs = document.querySelectorAll('.duration-input');
-    durationInputs.forEach(input => {
-        input.addEventListener('change', function() {
-            const taskId = parseInt(this.getAttribute('data-id'));
-            const duration = parseInt(this.value) || 0;
-            updateTaskDuration(taskId, duration);
-        });
-    });
-    
-    // 开始/暂停计时按钮事件
-    const startTimerBtns = document.querySelectorAll('.start-timer-btn');
-    startTimerBtns.forEach(btn => {
-        btn.addEventListener('click', function() {
-            const taskId = parseInt(this.getAttribute('data-id'));
-            toggleTaskTimer(taskId, this);
-        });
-    });
-    
     // 切换任务状态的函数
     // 创建显示AI回复的模态框
     function createAIResponseModal(aiResponse, taskTitle) {
@@ -178,6 +278,9 @@ document.addEventListener('DOMContentLoaded', function() {
     modal.style.display = 'none';
     }
     });
+    
+    // 返回内容元素，流式显示时逐段更新
+    return responseContent;
     }
     
     // 修改切换任务状态的函数
@@ -186,7 +289,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const taskTitle = document.querySelector(`.task-title[data-id="${taskId}"]`).textContent;
     
     // 发送POST请求到服务器
-    fetch(`/toggle-task/${taskId}`, {
+    fetch(`${API_BASE}/toggle-task/${taskId}`, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -206,9 +309,11 @@ document.addEventListener('DOMContentLoaded', function() {
         if (checkbox.checked) {
             taskItem.classList.add('completed');
             
-            // 如果有AI回复，显示弹窗
+            // 如果有AI回复，显示弹窗；AI还在后台处理时等待结果
             if (data.ai_response && data.ai_response.trim() !== '' && data.ai_response !== '0') {
                 createAIResponseModal(data.ai_response, taskTitle);
+            } else if (data.ai_status === 'pending') {
+                streamAISuggestion(taskId, taskTitle);
             }
         } else {
             taskItem.classList.remove('completed');
@@ -221,9 +326,86 @@ document.addEventListener('DOMContentLoaded', function() {
     });
     }
     
+    // 等待后台AI建议的任务：任务ID -> 任务标题
+    const pendingSuggestions = {};
+    
+    // 显示AI建议（SSE推送和轮询都会调用，只显示一次）
+    function showAISuggestion(taskId, suggestion) {
+        const taskTitle = pendingSuggestions[taskId];
+        if (taskTitle === undefined) {
+            return;
+        }
+        delete pendingSuggestions[taskId];
+        if (suggestion && suggestion.trim() !== '' && suggestion !== '0') {
+            createAIResponseModal(suggestion, taskTitle);
+        }
+    }
+    
+    // 流式显示AI建议：收到第一段文字就弹窗，之后逐段追加；不支持或连接中断时退回等待完整结果
+    function streamAISuggestion(taskId, taskTitle) {
+        if (!window.EventSource) {
+            waitForAISuggestion(taskId, taskTitle);
+            return;
+        }
+        
+        let content = null;
+        let text = '';
+        const source = new EventSource(`${API_BASE}/ai-suggestion/${taskId}/stream`);
+        
+        function render(value) {
+            if (content === null) {
+                content = createAIResponseModal(value, taskTitle);
+            } else {
+                content.textContent = value;
+            }
+        }
+        
+        source.addEventListener('delta', event => {
+            text += JSON.parse(event.data).text;
+            render(text);
+        });
+        source.addEventListener('done', event => {
+            source.close();
+            const suggestion = JSON.parse(event.data).ai_suggestion;
+            if (suggestion && suggestion.trim() !== '' && suggestion !== '0') {
+                render(suggestion);
+            }
+        });
+        source.addEventListener('error', () => {
+            source.close();
+            waitForAISuggestion(taskId, taskTitle);
+        });
+    }
+    
+    // 等待后台AI建议：优先由 ai 事件推送，同时低频轮询 /ai-result 兜底
+    function waitForAISuggestion(taskId, taskTitle) {
+        pendingSuggestions[taskId] = taskTitle;
+        let attempts = 0;
+        
+        function poll() {
+            if (pendingSuggestions[taskId] === undefined || attempts >= 30) {
+                delete pendingSuggestions[taskId];
+                return;
+            }
+            attempts += 1;
+            fetch(`${API_BASE}/ai-result/${taskId}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (data.ai_status === 'pending') {
+                        setTimeout(poll, 2000);
+                    } else {
+                        showAISuggestion(taskId, data.ai_suggestion);
+                    }
+                })
+                .catch(() => setTimeout(poll, 2000));
+        }
+        
+        setTimeout(poll, 2000);
+    }
+    
     // 添加新任务的函数
     function addNewTask(title, duration) {
-        fetch('/add-task', {
+        fetch(`${API_BASE}/add-task`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -244,7 +426,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // 删除任务的函数
     function deleteTask(taskId) {
         if (confirm('确定要删除这个任务吗？')) {
-            fetch(`/delete-task/${taskId}`, {
+            fetch(`${API_BASE}/delete-task/${taskId}`, {
                 method: 'DELETE',
                 headers: {
                     'Content-Type': 'application/json',
@@ -277,7 +459,7 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // 重命名任务的函数
     function renameTask(taskId, newTitle) {
-        fetch(`/rename-task/${taskId}`, {
+        fetch(`${API_BASE}/rename-task/${taskId}`, {
             method: 'PUT',
             headers: {
                 'Content-Type': 'application/json',
@@ -297,7 +479,7 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // 更新任务时长的函数
     function updateTaskDuration(taskId, duration) {
-        fetch(`/update-duration/${taskId}`, {
+        fetch(`${API_BASE}/update-duration/${taskId}`, {
             method: 'PUT',
             headers: {
                 'Content-Type': 'application/json',
@@ -422,7 +604,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const taskItem = button.closest('.task-item');
         
         // 获取当前任务的状态
-        fetch(`/get-task-time/${taskId}`)
+        fetch(`${API_BASE}/get-task-time/${taskId}`)
             .then(response => response.json())
             .then(taskData => {
                 const isCurrentlyTiming = taskData.is_timing;
@@ -430,7 +612,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 
                 // 如果正在计时，则停止计时
                 if (isCurrentlyTiming) {
-                    fetch(`/update-timing/${taskId}`, {
+                    fetch(`${API_BASE}/update-timing/${taskId}`, {
                         method: 'PUT',
                         headers: {
                             'Content-Type': 'application/json',
@@ -453,7 +635,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     }
                     
                     if (remainingMinutes > 0) {
-                        fetch(`/update-timing/${taskId}`, {
+                        fetch(`${API_BASE}/update-timing/${taskId}`, {
                             method: 'PUT',
                             headers: {
                                 'Content-Type': 'application/json',
@@ -471,43 +653,182 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
     
+    // 更新页面上的统计数据
+    function updateStats(data) {
+        document.getElementById('totalTasks').textContent = data.total_tasks;
+        document.getElementById('pendingTasks').textContent = data.pending_tasks;
+        document.getElementById('completedTasks').textContent = data.completed_tasks;
+        document.getElementById('completionRate').textContent = `${data.completion_rate}%`;
+    }
+    
+    // 根据剩余分钟数刷新计时器显示
+    function renderTimer(taskId, timeRemaining) {
+        const minutes = Math.floor(timeRemaining);
+        const seconds = Math.floor((timeRemaining % 1) * 60);
+        
+        const timerDisplay = document.querySelector(`.timer-display[data-id="${taskId}"]`);
+        if (timerDisplay) {
+            timerDisplay.textContent = `${minutes}:${seconds.toString().padStart(2, '0')}`;
+        }
+    }
+    
+    // 计时到期：恢复按钮状态，播放提示音并显示提醒（只处理一次）
+    function handleTimerExpired(taskId) {
+        const checkbox = document.querySelector(`.task-checkbox[data-id="${taskId}"]`);
+        const taskItem = checkbox ? checkbox.closest('.task-item') : null;
+        if (!taskItem || !taskItem.classList.contains('timing')) {
+            return;
+        }
+        renderTimer(taskId, 0);
+        const button = taskItem.querySelector('.start-timer-btn');
+        button.textContent = '开始';
+        button.classList.remove('pause');
+        taskItem.classList.remove('timing');
+        
+        // 播放结束提示音并显示提醒
+        playEndSound();
+        createAlarmModal(taskId);
+    }
+    
     // 添加定时器轮询函数，定期更新所有计时任务的显示
+    // 所有计时任务合并成一次请求，剩余时间由后端根据开始时间计算
     function updateTimersDisplay() {
+        const taskIds = [];
         document.querySelectorAll('.task-item.timing').forEach(taskItem => {
-            const taskId = parseInt(taskItem.querySelector('.task-checkbox').getAttribute('data-id'));
-            
-            fetch(`/get-task-time/${taskId}`)
-                .then(response => response.json())
-                .then(taskData => {
-                    const minutes = Math.floor(taskData.time_remaining);
-                    const seconds = Math.floor((taskData.time_remaining % 1) * 60);
-                    
-                    const timerDisplay = document.querySelector(`.timer-display[data-id="${taskId}"]`);
-                    if (timerDisplay) {
-                        timerDisplay.textContent = `${minutes}:${seconds.toString().padStart(2, '0')}`;
-                    }
+            taskIds.push(parseInt(taskItem.querySelector('.task-checkbox').getAttribute('data-id')));
+        });
+        
+        if (taskIds.length === 0) {
+            return;
+        }
+        
+        fetch(`${API_BASE}/get-task-times?ids=${taskIds.join(',')}`)
+            .then(response => response.json())
+            .then(data => {
+                (data.timers || []).forEach(taskData => {
+                    renderTimer(taskData.id, taskData.time_remaining);
                     
-                    // 如果时间到且仍在计时状态，显示提醒
-                    if (taskData.time_remaining <= 0 && taskData.is_timing) {
-                        const button = taskItem.querySelector('.start-timer-btn');
-                        button.textContent = '开始';
-                        button.classList.remove('pause');
-                        taskItem.classList.remove('timing');
-                        
-                        // 播放结束提示音并显示提醒
-                        playEndSound();
-                        createAlarmModal(taskId);
+                    // 如果时间到，显示提醒（后端到期时会立即停止计时，所以不再要求 is_timing）
+                    if (taskData.time_remaining <= 0) {
+                        handleTimerExpired(taskData.id);
                     }
                 });
+            });
+    }
+    
+    // 把其他页面（或本页面）产生的任务变化同步到当前页面
+    function applyTaskEvent(data) {
+        const checkbox = document.querySelector(`.task-checkbox[data-id="${data.id}"]`);
+        const taskItem = checkbox ? checkbox.closest('.task-item') : null;
+        
+        if (data.action === 'add') {
+            // 新任务需要完整的列表项，直接刷新页面；还有任务没有加载时，新任务会在最后一页加载出来
+            if (!taskItem && allTasksLoaded()) {
+                location.reload();
+            }
+            return;
+        }
+        if (!taskItem) {
+            return;
+        }
+        if (data.action === 'delete') {
+            taskItem.remove();
+            return;
+        }
+        
+        const task = data.task;
+        if (data.action === 'rename') {
+            taskItem.querySelector('.task-title').textContent = task.title;
+        } else if (data.action === 'toggle') {
+            checkbox.checked = task.completed;
+            taskItem.classList.toggle('completed', task.completed);
+        } else if (data.action === 'duration') {
+            taskItem.querySelector('.duration-input').value = task.duration;
+            if (!task.is_timing) {
+                renderTimer(task.id, task.time_remaining);
+            }
+        } else if (data.action === 'timing' && task.time_remaining > 0) {
+            // 到期由 timer_expired 事件处理，这里只同步开始/暂停
+            const button = taskItem.querySelector('.start-timer-btn');
+            button.textContent = task.is_timing ? '暂停' : '开始';
+            button.classList.toggle('pause', task.is_timing);
+            taskItem.classList.toggle('timing', task.is_timing);
+            renderTimer(task.id, task.time_remaining);
+        }
+    }
+    
+    // ============ 服务器推送（SSE），不可用时退回每秒轮询 ============
+    let pollTimer = null;
+    let pollTicks = 0;
+    
+    // 只刷新统计数据，不重新渲染页面
+    function refreshStats() {
+        fetch(`${API_BASE}/stats`)
+            .then(response => response.json())
+            .then(updateStats)
+            .catch(error => console.error('获取统计数据失败:', error));
+    }
+    
+    function pollOnce() {
+        updateTimersDisplay();
+        // 统计变化不频繁，每5秒刷新一次即可
+        if (pollTicks++ % 5 === 0) {
+            refreshStats();
+        }
+    }
+    
+    function startPolling() {
+        if (pollTimer === null) {
+            pollTimer = setInterval(pollOnce, 1000);
+        }
+    }
+    
+    function stopPolling() {
+        if (pollTimer !== null) {
+            clearInterval(pollTimer);
+            pollTimer = null;
+        }
+    }
+    
+    function connectEvents() {
+        if (!window.EventSource) {
+            startPolling();
+            return;
+        }
+        
+        const source = new EventSource(`${API_BASE}/events`);
+        source.addEventListener('open', stopPolling);
+        // 连接断开期间用轮询兜底，EventSource 会自动重连
+        source.addEventListener('error', () => {
+            startPolling();
+            // 服务器拒绝连接（如连接数已满）时 EventSource 不会重连，稍后重新连接
+            if (source.readyState === EventSource.CLOSED) {
+                setTimeout(connectEvents, 30000);
+            }
+        });
+        source.addEventListener('stats', event => updateStats(JSON.parse(event.data)));
+        source.addEventListener('timers', event => {
+            JSON.parse(event.data).timers.forEach(taskData => {
+                renderTimer(taskData.id, taskData.time_remaining);
+            });
+        });
+        source.addEventListener('timer_expired', event => {
+            handleTimerExpired(JSON.parse(event.data).id);
+        });
+        source.addEventListener('task', event => applyTaskEvent(JSON.parse(event.data)));
+        source.addEventListener('ai', event => {
+            const data = JSON.parse(event.data);
+            if (data.ai_status !== 'pending') {
+                showAISuggestion(data.id, data.ai_suggestion);
+            }
         });
     }
     
-    // 每秒钟更新一次计时器显示
-    setInterval(updateTimersDisplay, 1000);
+    connectEvents();
     
     // 修改updateTaskDuration函数
     function updateTaskDuration(taskId, duration) {
-        fetch(`/update-duration/${taskId}`, {
+        fetch(`${API_BASE}/update-duration/${taskId}`, {
             method: 'PUT',
             headers: {
                 'Content-Type': 'application/json',
@@ -538,7 +859,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // 修改删除任务的函数
     function deleteTask(taskId) {
         if (confirm('确定要删除这个任务吗？')) {
-            fetch(`/delete-task/${taskId}`, {
+            fetch(`${API_BASE}/delete-task/${taskId}`, {
                 method: 'DELETE',
                 headers: {
                     'Content-Type': 'application/json',
@@ -0,0 +1,108 @@
+import logging
+import re
+import threading
+
+'''
+任务清单（按用户/清单分区）
+每个清单是一个独立的分区：
+- 有自己的任务仓库（单独的任务文件或数据库，即存储分片）和自己的锁，不同清单的读写互不阻塞
+- 有自己的任务数量上限
+- 第一次访问时才打开（加载任务、恢复计时和未完成的AI任务），清单总数有上限
+- 只读请求不创建清单：还不存在的清单看到的是一个空清单，不建目录也不占用清单数量
+任务ID只在清单内唯一，计时器、AI后台任务等用 (清单ID, 任务ID) 区分
+'''
+
+logger = logging.getLogger(__name__)
+
+# 默认清单：不带 /lists/<清单ID> 前缀的路由使用，数据就是原来的 tasks.json / tasks.db
+DEFAULT_LIST = 'default'
+# 清单ID只允许字母、数字、下划线和连字符（同时用作目录名）
+LIST_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class ListLimitError(Exception):
+    """清单数量已达到上限"""
+
+
+def parse_limits(text):
+    """解析各清单的任务数量上限，格式为 "work=50,home=8"，格式错误的项忽略"""
+    limits = {}
+    for item in (text or '').split(','):
+        list_id, _, value = item.partition('=')
+        try:
+            limits[list_id.strip()] = int(value)
+        except ValueError:
+            if item.strip():
+                logger.warning(f"清单任务上限配置格式错误，已忽略: {item}")
+    return limits
+
+
+class TaskList:
+    """一个任务清单：任务仓库和任务数量上限"""
+
+    def __init__(self, list_id, store, max_tasks):
+        self.list_id = list_id
+        self.store = store
+        self.max_tasks = max_tasks
+        # 最近一次推送给该清单页面的统计数据，只有变化时才推送
+        self.last_published_stats = {}
+
+    @property
+    def lock(self):
+        return self.store.lock
+
+
+class TaskListRegistry:
+    """按清单ID打开并缓存任务清单"""
+
+    def __init__(self, open_store, max_tasks=8, limits=None, max_lists=100, on_open=None, store_exists=None):
+        # open_store(清单ID) 返回还没有加载的任务仓库（会创建清单的目录）
+        self.open_store = open_store
+        # store_exists(清单ID) 判断清单是否已经创建过，未提供时认为都已存在
+        self.store_exists = store_exists
+        # 默认的每个清单任务数量上限，limits 中可以为单个清单单独设置
+        self.max_tasks = max_tasks
+        self.limits = limits or {}
+        self.max_lists = max_lists
+        # 清单第一次打开（加载完成）后调用 on_open(task_list)
+        self.on_open = on_open
+        self._lists = {}
+        self._lock = threading.Lock()
+
+    def get(self, list_id, create=True):
+        """获取清单，第一次访问时打开；清单ID不合法时抛出 ValueError，清单数量超限时抛出 ListLimitError
+
+        create=False 时不创建还不存在的清单，返回 None
+        """
+        task_list = self._lists.get(list_id)
+        if task_list is not None:
+            return task_list
+        if not isinstance(list_id, str) or not LIST_ID_PATTERN.match(list_id):
+            raise ValueError(f'清单ID不合法: {list_id}')
+        if not create and self.store_exists is not None and not self.store_exists(list_id):
+            return None
+        with self._lock:
+            task_list = self._lists.get(list_id)
+            if task_list is not None:
+                return task_list
+            if len(self._lists) >= self.max_lists:
+                raise ListLimitError(f'清单数量已达到上限{self.max_lists}个')
+            store = self.open_store(list_id)
+            store.load()
+            task_list = TaskList(list_id, store, self.limits.get(list_id, self.max_tasks))
+            self._lists[list_id] = task_list
+        logger.info(f"已打开任务清单 {list_id}，共 {len(store)} 个任务，上限 {task_list.max_tasks} 个")
+        if self.on_open is not None:
+            self.on_open(task_list)
+        return task_list
+
+    def loaded(self):
+        """已经打开的清单"""
+        return list(self._lists.values())
+
+    def close(self):
+        for task_list in self.loaded():
+            try:
+                task_list.store.close()
+            except Exception as e:
+                logger.error(f"关闭任务清单 {task_list.list_id} 失败: {str(e)}", exc_info=True)
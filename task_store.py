@@ -0,0 +1,683 @@
+import base64
+import bisect
+import contextlib
+import copy
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+import metrics
+
+'''
+任务仓库模块
+进程内只保留一份任务列表，所有路由都通过这里读写任务：
+- 读操作直接读内存，不再访问磁盘
+- 写操作只修改内存并标记为脏数据，由后台线程延迟合并写盘（write-behind）
+- 进程退出时会再写一次，保证数据落盘
+
+持久化方式由存储后端决定（环境变量 TASKS_BACKEND）：
+- json：每次写盘把整个任务数组原子地重写到 tasks.json（默认）
+- journal：每次修改追加一条记录到日志文件，定期压缩成快照
+- sqlite：不经过本模块的内存仓库，见 sqlite_store.SqliteTaskStore
+
+内存仓库为分页查询维护索引（随每次修改增量更新）：按ID、标题、时长排序的有序索引，
+以及已完成、正在计时的任务ID集合，查询一页不需要遍历或排序全部任务
+'''
+
+logger = logging.getLogger(__name__)
+
+
+def write_json_atomic(path, data):
+    """先写临时文件再重命名，避免写到一半时崩溃导致文件损坏"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JsonFileBackend:
+    """整体快照存储：每次写盘把全部任务重写到一个JSON文件"""
+
+    name = 'json'
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """读取任务列表，文件不存在时返回None"""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def record(self, op, task_id, fields=None):
+        """单条修改不单独落盘，等待整体快照"""
+
+    def begin_batch(self):
+        """整体快照天然包含整批修改"""
+
+    def end_batch(self):
+        pass
+
+    def wants_snapshot(self):
+        return True
+
+    def rotate(self):
+        """整体快照不需要切分日志"""
+
+    def flush(self, snapshot):
+        if snapshot is not None:
+            write_json_atomic(self.path, snapshot)
+
+    def close(self):
+        pass
+
+
+class JournalBackend:
+    """追加日志存储：每次修改追加一行记录，定期压缩成快照
+
+    文件布局（以 tasks.json 为例）：
+    - tasks.json            最近一次压缩得到的快照，格式与 json 后端相同
+    - tasks.json.journal    当前正在追加的日志
+    - tasks.json.journal.N  压缩前封存的日志段，快照写完后删除
+    启动时按顺序回放 快照 + 封存日志段 + 当前日志。
+    所有记录都是“设置字段”语义，重复回放结果不变，
+    所以压缩过程中任何时刻崩溃都不会丢数据或损坏文件。
+    批量修改（TaskStore.batch）写成一条 batch 记录，整批回放或整批丢弃。
+    """
+
+    name = 'journal'
+
+    def __init__(self, path, compact_every=1000):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        # 日志记录数超过该值时，下一次写盘会顺带做一次压缩
+        self.compact_every = compact_every
+        self._file = None
+        self._records = 0
+        self._segment = 0
+        # 批量修改期间暂存的记录，结束时写成一条 batch 记录
+        self._batch = None
+
+    def _sealed_segments(self):
+        """返回按序号排列的封存日志段 [(序号, 路径)]"""
+        directory = os.path.dirname(os.path.abspath(self.journal_path))
+        prefix = os.path.basename(self.journal_path) + '.'
+        segments = []
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name[len(prefix):].isdigit():
+                segments.append((int(name[len(prefix):]), os.path.join(directory, name)))
+        return sorted(segments)
+
+    def _replay(self, journal_path, tasks):
+        """回放一个日志文件，返回回放的记录数"""
+        count = 0
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 崩溃时最后一行可能只写了一半，直接丢弃
+                    logger.warning(f"日志 {journal_path} 第 {line_no} 行不完整，已忽略")
+                    continue
+                # 批量修改是一行记录，只会整批回放或整批丢弃
+                for item in entry['entries'] if entry.get('op') == 'batch' else [entry]:
+                    self._apply(item, tasks)
+                    count += 1
+        return count
+
+    @staticmethod
+    def _apply(entry, tasks):
+        op = entry.get('op')
+        task_id = entry.get('id')
+        if op == 'add':
+            tasks[task_id] = entry['fields']
+        elif op == 'delete':
+            tasks.pop(task_id, None)
+        elif task_id in tasks:
+            tasks[task_id].update(entry.get('fields') or {})
+
+    def load(self):
+        """读取快照并回放日志，什么都不存在时返回None"""
+        segments = self._sealed_segments()
+        has_journal = os.path.exists(self.journal_path)
+        if not os.path.exists(self.path) and not segments and not has_journal:
+            return None
+
+        tasks = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                tasks = {task['id']: task for task in json.load(f)}
+        replayed = 0
+        for _, segment_path in segments:
+            replayed += self._replay(segment_path, tasks)
+        if has_journal:
+            replayed += self._replay(self.journal_path, tasks)
+        logger.info(f"已回放 {replayed} 条任务日志记录")
+
+        self._segment = segments[-1][0] if segments else 0
+        self._records = replayed
+        self._open_journal()
+        return list(tasks.values())
+
+    def _open_journal(self):
+        if self._file is None:
+            # 上次崩溃可能留下不完整的最后一行，先补换行，避免和新记录粘在一起
+            needs_newline = False
+            if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) > 0:
+                with open(self.journal_path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    needs_newline = f.read(1) != b'\n'
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+            if needs_newline:
+                self._file.write('\n')
+
+    def record(self, op, task_id, fields=None):
+        """追加一条修改记录（调用方持有仓库锁）"""
+        self._open_journal()
+        entry = {'op': op, 'id': task_id}
+        if fields is not None:
+            entry['fields'] = fields
+        if self._batch is not None:
+            self._batch.append(entry)
+            return
+        self._write_entry(entry, 1)
+
+    def _write_entry(self, entry, records):
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        # 交给操作系统，进程崩溃也不会丢失；fsync 留给后台写盘
+        self._file.flush()
+        self._records += records
+
+    def begin_batch(self):
+        """开始批量修改（调用方持有仓库锁），之后的记录暂存到 end_batch"""
+        self._batch = []
+
+    def end_batch(self):
+        """把整批记录写成一行，崩溃时不会只留下半批修改"""
+        entries, self._batch = self._batch, None
+        if entries:
+            self._open_journal()
+            self._write_entry({'op': 'batch', 'entries': entries}, len(entries))
+
+    def wants_snapshot(self):
+        return self._records >= self.compact_every
+
+    def rotate(self):
+        """封存当前日志段（调用方持有仓库锁，和快照在同一时刻）"""
+        self._open_journal()
+        self._file.close()
+        self._file = None
+        self._segment += 1
+        os.replace(self.journal_path, f"{self.journal_path}.{self._segment}")
+        self._records = 0
+        self._open_journal()
+
+    def flush(self, snapshot):
+        """写快照（压缩）或把日志同步到磁盘"""
+        if snapshot is None:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            return
+        sealed = self._segment
+        write_json_atomic(self.path, snapshot)
+        # 快照已包含封存日志段中的全部修改，可以删除
+        for number, segment_path in self._sealed_segments():
+            if number <= sealed:
+                os.remove(segment_path)
+        logger.info(f"任务日志已压缩为快照 {self.path}")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+STORAGE_BACKENDS = {
+    JsonFileBackend.name: JsonFileBackend,
+    JournalBackend.name: JournalBackend,
+}
+
+
+def create_backend(name, path):
+    """根据名称创建存储后端，未知名称时退回json后端"""
+    backend_class = STORAGE_BACKENDS.get((name or 'json').lower())
+    if backend_class is None:
+        logger.warning(f"未知的存储后端 {name}，使用json后端")
+        backend_class = JsonFileBackend
+    return backend_class(path)
+
+
+# 分页查询支持的排序字段
+SORT_FIELDS = ('id', 'title', 'duration')
+
+
+def encode_cursor(sort, descending, key, task_id):
+    """把一页最后一个任务的排序键编码成不透明的游标字符串"""
+    data = json.dumps([sort, descending, key, task_id], ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort, descending):
+    """解析游标，返回 (排序键, 任务ID)；游标无效或与排序方式不一致时抛出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, cursor_descending, key, task_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError('游标无效')
+    if cursor_sort != sort or cursor_descending != descending or not isinstance(task_id, int):
+        raise ValueError('游标与排序方式不一致')
+    return key, task_id
+
+
+def sort_key(sort, task):
+    """内存索引中的排序键：标题不区分大小写，时长按数值排序（兼容旧数据中的数字字符串）
+
+    时长不是数字时抛出 ValueError，调用方在修改仓库状态之前计算排序键，出错时什么都不改
+    """
+    if sort == 'title':
+        return task.get('title', '').casefold()
+    if sort == 'duration':
+        duration = task.get('duration') or 0
+        if isinstance(duration, str):
+            try:
+                return float(duration)
+            except ValueError:
+                raise ValueError(f"任务 {task.get('id')} 的时长不是数字: {duration!r}")
+        if not isinstance(duration, (int, float)):
+            raise ValueError(f"任务 {task.get('id')} 的时长不是数字: {duration!r}")
+        return duration
+    return task['id']
+
+
+class SortedIndex:
+    """按 (排序键, 任务ID) 排序的索引，支持从游标位置开始顺序或倒序遍历"""
+
+    def __init__(self, sort):
+        self.sort = sort
+        self._entries = []
+
+    def rebuild(self, tasks):
+        self._entries = sorted((sort_key(self.sort, task), task['id']) for task in tasks)
+
+    def add(self, task, key=None):
+        if key is None:
+            key = sort_key(self.sort, task)
+        bisect.insort(self._entries, (key, task['id']))
+
+    def remove(self, task):
+        entry = (sort_key(self.sort, task), task['id'])
+        position = bisect.bisect_left(self._entries, entry)
+        if position < len(self._entries) and self._entries[position] == entry:
+            del self._entries[position]
+
+    def iterate(self, after=None, descending=False):
+        """从 after=(排序键, 任务ID) 之后（倒序时为之前）开始依次返回 (排序键, 任务ID)"""
+        if descending:
+            end = bisect.bisect_left(self._entries, after) if after is not None else len(self._entries)
+            for position in range(end - 1, -1, -1):
+                yield self._entries[position]
+        else:
+            start = bisect.bisect_right(self._entries, after) if after is not None else 0
+            for position in range(start, len(self._entries)):
+                yield self._entries[position]
+
+
+class TaskStore:
+    """进程级任务仓库，内存中按ID索引任务，脏数据延迟合并写盘"""
+
+    def __init__(self, backend, default_tasks=None, flush_delay=0.5):
+        self.backend = backend
+        self.default_tasks = default_tasks or []
+        # 合并写盘的等待时间（秒），这段时间内的多次修改只写一次
+        self.flush_delay = flush_delay
+        # 可重入锁，路由里需要“读-改-写”时可以直接 with task_store.lock
+        self.lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._tasks = {}
+        self._next_id = 1
+        # 已完成任务数，每次修改时增量维护，统计不需要遍历任务
+        self._completed = 0
+        # 分页查询用的索引，在 self.lock 内随修改增量维护
+        self._indexes = {sort: SortedIndex(sort) for sort in SORT_FIELDS}
+        self._completed_ids = set()
+        self._timing_ids = set()
+        self._dirty = False
+        # batch() 的嵌套层数，批量修改期间不唤醒写盘线程
+        self._batch_depth = 0
+        self._flush_event = threading.Event()
+        self._flusher = None
+        self._closed = False
+
+    # ============ 加载与写盘 ============
+
+    def load(self):
+        """从磁盘加载任务数据，确保所有字段都存在"""
+        created = False
+        try:
+            tasks = self.backend.load()
+            if tasks is None:
+                logger.info(f"任务文件 {self.backend.path} 不存在，创建默认任务数据")
+                tasks = copy.deepcopy(self.default_tasks)
+                created = True
+        except Exception as e:
+            logger.error(f"加载任务数据失败: {str(e)}", exc_info=True)
+            tasks = []
+
+        updated = created
+        for task in tasks:
+            # 确保所有任务都有ai_duration字段
+            if 'ai_duration' not in task:
+                task['ai_duration'] = 0
+                updated = True
+
+        with self.lock:
+            self._tasks = {task['id']: task for task in sorted(tasks, key=lambda task: task['id'])}
+            self._next_id = max(self._tasks) + 1 if self._tasks else 1
+            self._completed = sum(1 for task in tasks if task.get('completed'))
+            self._rebuild_indexes()
+            self._dirty = updated
+
+        if updated:
+            self.flush(compact=True)
+        self._start_flusher()
+        logger.info(f"成功加载任务数据，共 {len(tasks)} 个任务")
+        return self.list_tasks()
+
+    def _start_flusher(self):
+        """启动后台写盘线程（只启动一次）"""
+        if self._flusher is not None:
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, name='task-store-flusher', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._flush_event.wait()
+            if self._closed:
+                break
+            # 等待一小段时间，让突发的多次修改合并成一次写盘
+            time.sleep(self.flush_delay)
+            self._flush_event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"任务数据写盘失败: {str(e)}", exc_info=True)
+
+    def _mark_dirty(self):
+        self._dirty = True
+        if not self._batch_depth:
+            self._flush_event.set()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """在一次加锁内执行多个修改：整批只触发一次写盘，journal 后端把整批写成一条日志记录"""
+        with self.lock:
+            self._batch_depth += 1
+            if self._batch_depth == 1:
+                self.backend.begin_batch()
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self.backend.end_batch()
+                    if self._dirty:
+                        self._flush_event.set()
+
+    def flush(self, compact=False):
+        """把脏数据写回磁盘，没有修改时直接返回
+
+        后端需要快照（或 compact=True）时，在锁内复制任务并封存日志，
+        真正的磁盘写入放在锁外进行，不阻塞其他请求。
+        """
+        with self._write_lock:
+            with self.lock:
+                if not self._dirty:
+                    return False
+                snapshot = None
+                if compact or self.backend.wants_snapshot():
+                    snapshot = [dict(task) for task in self._tasks.values()]
+                    self.backend.rotate()
+                self._dirty = False
+            started = time.perf_counter()
+            try:
+                self.backend.flush(snapshot)
+            except Exception:
+                # 写失败时保留脏标记，等待下一次写盘
+                with self.lock:
+                    self._dirty = True
+                raise
+            metrics.storage_seconds.labels(self.backend.name, 'write').observe(time.perf_counter() - started)
+        if snapshot is not None:
+            logger.info(f"任务数据已保存到 {self.backend.path}，共 {len(snapshot)} 个任务")
+        return True
+
+    def close(self):
+        """停止后台线程并写入剩余的脏数据"""
+        self._closed = True
+        self._flush_event.set()
+        try:
+            self.flush(compact=True)
+        except Exception as e:
+            logger.error(f"关闭任务仓库时写盘失败: {str(e)}", exc_info=True)
+        self.backend.close()
+
+    # ============ 查询索引 ============
+
+    def _rebuild_indexes(self):
+        for index in self._indexes.values():
+            index.rebuild(self._tasks.values())
+        self._completed_ids = {task_id for task_id, task in self._tasks.items() if task.get('completed')}
+        self._timing_ids = {task_id for task_id, task in self._tasks.items() if task.get('is_timing')}
+
+    def _index_keys(self, task):
+        """任务在各个有序索引中的排序键；在修改任何状态之前调用，无效字段在这里就抛出异常"""
+        return {sort: sort_key(sort, task) for sort in self._indexes}
+
+    def _index_task(self, task, keys):
+        for sort, index in self._indexes.items():
+            index.add(task, keys[sort])
+        if task.get('completed'):
+            self._completed_ids.add(task['id'])
+        if task.get('is_timing'):
+            self._timing_ids.add(task['id'])
+
+    def _unindex_task(self, task):
+        for index in self._indexes.values():
+            index.remove(task)
+        self._completed_ids.discard(task['id'])
+        self._timing_ids.discard(task['id'])
+
+    def _reindex_task(self, task, changes):
+        """修改任务字段，只更新排序键发生变化的索引（计时等高频修改不触及有序索引）"""
+        updated = dict(task, **changes)
+        # 先算出新的排序键，无效时任务和索引都保持原样
+        keys = {sort: sort_key(sort, updated) for sort in self._indexes if sort in changes}
+        for sort in keys:
+            self._indexes[sort].remove(task)
+        task.update(changes)
+        for sort, key in keys.items():
+            self._indexes[sort].add(task, key)
+        for ids, field in ((self._completed_ids, 'completed'), (self._timing_ids, 'is_timing')):
+            if task.get(field):
+                ids.add(task['id'])
+            else:
+                ids.discard(task['id'])
+
+    # ============ 读操作 ============
+
+    @metrics.timed(metrics.storage_seconds, store='memory', operation='query')
+    def query(self, completed=None, is_timing=None, title_prefix=None, sort='id', descending=False,
+              cursor=None, limit=50):
+        """
+        分页查询任务，返回 (任务副本列表, 下一页游标)，没有下一页时游标为None
+        参数:
+            completed / is_timing: 按完成、计时状态过滤，None 表示不过滤
+            title_prefix: 标题前缀（不区分大小写）
+            sort: 排序字段（SORT_FIELDS），相同时按ID排序
+            cursor: 上一页返回的游标，无效时抛出 ValueError
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f'不支持的排序字段: {sort}')
+        after = tuple(decode_cursor(cursor, sort, descending)) if cursor else None
+        prefix = title_prefix.casefold() if title_prefix else None
+
+        def matches(task):
+            return ((completed is None or bool(task.get('completed')) == completed)
+                    and (is_timing is None or bool(task.get('is_timing')) == is_timing)
+                    and (prefix is None or task.get('title', '').casefold().startswith(prefix)))
+
+        with self.lock:
+            index = self._indexes[sort]
+            if sort == 'title' and prefix:
+                # 标题前缀是标题索引上的一段连续区间
+                if descending:
+                    bound = (prefix + '\U0010ffff',)
+                    start = bound if after is None else min(after, bound)
+                else:
+                    start = (prefix,) if after is None else max(after, (prefix,))
+                entries = index.iterate(start, descending)
+            else:
+                # 过滤条件命中的任务较少时（如计时中的任务），直接从ID集合取出再排序，不必扫描整个索引
+                candidate_sets = []
+                if is_timing:
+                    candidate_sets.append(self._timing_ids)
+                if completed:
+                    candidate_sets.append(self._completed_ids)
+                if prefix:
+                    in_prefix = itertools.takewhile(lambda entry: entry[0].startswith(prefix),
+                                                    self._indexes['title'].iterate((prefix,)))
+                    candidate_sets.append({task_id for _, task_id in in_prefix})
+                candidates = min(candidate_sets, key=len) if candidate_sets else None
+                if candidates is not None and len(candidates) * 4 < len(self._tasks):
+                    entries = sorted(((sort_key(sort, self._tasks[task_id]), task_id) for task_id in candidates),
+                                     reverse=descending)
+                    if after is not None:
+                        entries = [entry for entry in entries if (entry < after if descending else entry > after)]
+                else:
+                    entries = index.iterate(after, descending)
+
+            page = []
+            has_more = False
+            for key, task_id in entries:
+                task = self._tasks[task_id]
+                if sort == 'title' and prefix and not key.startswith(prefix):
+                    break
+                if not matches(task):
+                    continue
+                if len(page) == limit:
+                    has_more = True
+                    break
+                page.append(dict(task))
+
+        next_cursor = None
+        if has_more and page:
+            last = page[-1]
+            next_cursor = encode_cursor(sort, descending, sort_key(sort, last), last['id'])
+        return page, next_cursor
+
+    @metrics.timed(metrics.storage_seconds, store='memory', operation='list_tasks')
+    def list_tasks(self):
+        """返回所有任务的副本，按ID顺序排列"""
+        with self.lock:
+            return [dict(task) for task in self._tasks.values()]
+
+    @metrics.timed(metrics.storage_seconds, store='memory', operation='get')
+    def get(self, task_id):
+        """按ID获取任务副本，不存在时返回None"""
+        with self.lock:
+            task = self._tasks.get(task_id)
+            return dict(task) if task else None
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def count_completed(self):
+        """已完成的任务数量（增量维护的计数，O(1)）"""
+        return self._completed
+
+    def counts(self):
+        """同一时刻的 (任务总数, 已完成数)"""
+        with self.lock:
+            return len(self._tasks), self._completed
+
+    def __contains__(self, task_id):
+        return task_id in self._tasks
+
+    # ============ 写操作 ============
+
+    @metrics.timed(metrics.storage_seconds, store='memory', operation='add')
+    def add(self, fields):
+        """添加新任务并分配ID，返回新任务副本"""
+        with self.lock:
+            task = dict(fields)
+            task['id'] = self._next_id
+            keys = self._index_keys(task)
+            self._next_id += 1
+            self._tasks[task['id']] = task
+            self._completed += bool(task.get('completed'))
+            self._index_task(task, keys)
+            self.backend.record('add', task['id'], dict(task))
+            self._mark_dirty()
+            return dict(task)
+
+    @metrics.timed(metrics.storage_seconds, store='memory', operation='add_many')
+    def add_many(self, fields_list):
+        """批量添加任务，整批只触发一次写盘，返回新任务副本列表"""
+        with self.lock:
+            # 先为整批任务分配ID并计算排序键，任何一个无效时整批都不添加
+            pending = []
+            for offset, fields in enumerate(fields_list):
+                task = dict(fields)
+                task['id'] = self._next_id + offset
+                pending.append((task, self._index_keys(task)))
+            tasks = []
+            for task, keys in pending:
+                self._next_id += 1
+                self._tasks[task['id']] = task
+                self._completed += bool(task.get('completed'))
+                self._index_task(task, keys)
+                self.backend.record('add', task['id'], dict(task))
+                tasks.append(dict(task))
+            if tasks:
+                self._mark_dirty()
+            return tasks
+
+    @metrics.timed(metrics.storage_seconds, store='memory', operation='update')
+    def update(self, task_id, changes, op='update'):
+        """更新任务字段，返回更新后的任务副本，不存在时返回None
+
+        op 是写入日志的修改类型（toggle/rename/duration/timing等），只用于记录和排查
+        """
+        with self.lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+            was_completed = bool(task.get('completed'))
+            self._reindex_task(task, changes)
+            self._completed += bool(task.get('completed')) - was_completed
+            self.backend.record(op, task_id, dict(changes))
+            self._mark_dirty()
+            return dict(task)
+
+    @metrics.timed(metrics.storage_seconds, store='memory', operation='delete')
+    def delete(self, task_id):
+        """删除任务，返回被删除的任务，不存在时返回None"""
+        with self.lock:
+            task = self._tasks.pop(task_id, None)
+            if task is not None:
+                self._completed -= bool(task.get('completed'))
+                self._unindex_task(task)
+                self.backend.record('delete', task_id)
+                self._mark_dirty()
+            return task
@@ -0,0 +1,110 @@
+import heapq
+import logging
+import threading
+import time
+
+'''
+任务计时调度器
+所有任务的倒计时共用一个后台线程：
+- 每个计时只记录一个单调时钟上的截止时间，剩余时间在读取时计算
+- 后台线程按截止时间最早的计时睡眠，到期时调用回调（通常是写回任务状态）
+- 计时过程中不读写文件，只有开始、停止、到期时由调用方落盘
+'''
+
+logger = logging.getLogger(__name__)
+
+
+class TimerScheduler:
+    """单线程计时调度器，计时状态全部保存在内存中"""
+
+    def __init__(self, on_expire=None):
+        # 到期回调：on_expire(task_id)，在调度线程中执行
+        self.on_expire = on_expire
+        self._cond = threading.Condition()
+        # 小顶堆：(截止时间, 任务ID, 代数)，停止或重新开始后旧条目作废
+        self._heap = []
+        # 正在计时的任务：任务ID -> (截止时间, 代数)
+        self._active = {}
+        self._generation = 0
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='timer-scheduler', daemon=True)
+            self._thread.start()
+
+    def start(self, task_id, minutes):
+        """开始计时，minutes 为剩余分钟数（可以是小数），已在计时则返回False"""
+        with self._cond:
+            if task_id in self._active:
+                logger.warning(f"任务 {task_id} 已有计时器在运行")
+                return False
+            self._generation += 1
+            deadline = time.monotonic() + max(0, minutes) * 60
+            self._active[task_id] = (deadline, self._generation)
+            heapq.heappush(self._heap, (deadline, task_id, self._generation))
+            self._ensure_thread()
+            # 新的截止时间可能比当前等待的更早，唤醒调度线程重新计算
+            self._cond.notify()
+        logger.info(f"任务 {task_id} 计时器已启动，剩余 {minutes} 分钟")
+        return True
+
+    def stop(self, task_id):
+        """停止计时，返回剩余分钟数；任务未在计时时返回None"""
+        with self._cond:
+            entry = self._active.pop(task_id, None)
+        if entry is None:
+            return None
+        remaining = max(0.0, (entry[0] - time.monotonic()) / 60)
+        logger.info(f"任务 {task_id} 计时器已停止，剩余 {remaining:.2f} 分钟")
+        return remaining
+
+    def remaining(self, task_id):
+        """计算剩余分钟数，任务未在计时时返回None"""
+        with self._cond:
+            entry = self._active.get(task_id)
+        if entry is None:
+            return None
+        return max(0.0, (entry[0] - time.monotonic()) / 60)
+
+    def is_active(self, task_id):
+        return task_id in self._active
+
+    def active_count(self):
+        return len(self._active)
+
+    def active_ids(self):
+        """正在计时的任务ID列表"""
+        with self._cond:
+            return list(self._active)
+
+    def _run(self):
+        logger.info("计时调度线程已启动")
+        while True:
+            expired = []
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                deadline, task_id, generation = self._heap[0]
+                entry = self._active.get(task_id)
+                if entry is None or entry[1] != generation:
+                    # 已停止或重新开始的旧条目，直接丢弃
+                    heapq.heappop(self._heap)
+                    continue
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                del self._active[task_id]
+                expired.append(task_id)
+
+            # 回调放在锁外执行，避免回调里再调用调度器造成死锁
+            for task_id in expired:
+                logger.info(f"任务 {task_id} 时间到！")
+                if self.on_expire is None:
+                    continue
+                try:
+                    self.on_expire(task_id)
+                except Exception as e:
+                    logger.error(f"处理任务 {task_id} 计时到期失败: {str(e)}", exc_info=True)
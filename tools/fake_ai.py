@@ -0,0 +1,116 @@
+"""
+本地模拟的AI服务（OpenAI 兼容的 /v1/chat/completions）
+
+基于 asyncio，延迟期间不占用线程，可以同时挂起成千上万个请求，用于基准测试和离线开发：
+- 时长估计的提示词回复一个数字，批量估计回复与任务数相同长度的JSON数组，其他回复一句建议
+- 支持 stream=true（逐字以SSE返回）
+- --latency 设置每个请求的延迟，--fail-rate 按比例返回 500，用于观察重试和熔断
+
+用法:
+    python tools/fake_ai.py --port 8765 --latency 1.0
+    AI_API_URL=http://127.0.0.1:8765/v1 API_KEY=x AI_MODEL=fake python app.py
+"""
+import argparse
+import asyncio
+import json
+import random
+
+
+def reply_text(messages):
+    system = messages[0]['content'] if messages else ''
+    if '只返回数字' in system:
+        return '25'
+    if 'JSON' in system:
+        count = messages[-1]['content'].count('\n') + 1
+        return json.dumps([15] * count)
+    return '建议你下次多留一些时间。'
+
+
+def completion(content):
+    return {
+        'id': 'fake', 'object': 'chat.completion', 'created': 0, 'model': 'fake',
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': 10, 'completion_tokens': len(content), 'total_tokens': 10 + len(content)}
+    }
+
+
+def chunk(text):
+    return {
+        'id': 'fake', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'fake',
+        'choices': [{'index': 0, 'delta': {'content': text}, 'finish_reason': None}]
+    }
+
+
+class FakeAI:
+    def __init__(self, latency, fail_rate, chunk_delay):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.chunk_delay = chunk_delay
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                headers = {}
+                for line in head.decode('latin-1').split('\r\n')[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                await self.respond(writer, json.loads(body or b'{}'))
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, request):
+        await asyncio.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            self.write(writer, 500, 'application/json', b'{"error": {"message": "fake failure"}}')
+            return
+        content = reply_text(request.get('messages', []))
+        if not request.get('stream'):
+            self.write(writer, 200, 'application/json', json.dumps(completion(content)).encode())
+            return
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n')
+        for text in content:
+            self.write_chunk(writer, f"data: {json.dumps(chunk(text))}\n\n".encode())
+            await writer.drain()
+            await asyncio.sleep(self.chunk_delay)
+        self.write_chunk(writer, b'data: [DONE]\n\n')
+        self.write_chunk(writer, b'')
+        await writer.drain()
+
+    @staticmethod
+    def write(writer, status, content_type, body):
+        reason = 'OK' if status == 200 else 'Error'
+        writer.write(f'HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n'
+                     f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+
+    @staticmethod
+    def write_chunk(writer, data):
+        writer.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+
+
+async def serve(host, port, fake):
+    server = await asyncio.start_server(fake.handle, host, port, backlog=4096)
+    print(f"http://{host}:{server.sockets[0].getsockname()[1]}/v1", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OpenAI 兼容的本地模拟AI服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765, help='0 表示随机端口（启动后打印地址）')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的延迟（秒）')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='返回 500 的比例（0~1）')
+    parser.add_argument('--chunk-delay', type=float, default=0.01, help='流式回复每个字之间的延迟（秒）')
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, FakeAI(args.latency, args.fail_rate, args.chunk_delay)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+51开发板模拟器（基于 pty）
+
+创建一个伪终端，按 51/main.c 的协议应答：收到以换行结尾的一帧数据后，
+含 'P' 的帧回复一个字节 'P'，含 'S' 的帧回复 'S'。启动后打印串口路径，
+把它设置为 SERIAL_PORT 即可在没有开发板的机器上运行应用（仅限 Linux/macOS）。
+
+用法:
+    python tools/fake_board.py
+    python tools/fake_board.py --ack-delay 0.05 --drop-every 5
+    SERIAL_PORT=/dev/pts/3 python app.py
+"""
+import argparse
+import os
+import sys
+import time
+import tty
+
+
+def main():
+    parser = argparse.ArgumentParser(description='基于 pty 的51开发板模拟器')
+    parser.add_argument('--ack-delay', type=float, default=0.0, help='回复确认前的延迟（秒）')
+    parser.add_argument('--drop-every', type=int, default=0, help='每 N 帧不回复一次确认（0 表示不丢弃）')
+    args = parser.parse_args()
+
+    master, slave = os.openpty()
+    # 原始模式：不回显、不做换行转换，和真实串口一致
+    tty.setraw(slave)
+    print(os.ttyname(slave), flush=True)
+
+    frames = 0
+    buffer = b''
+    while True:
+        try:
+            data = os.read(master, 64)
+        except OSError:
+            # 应用关闭串口后 pty 会短暂报错，等待重新打开
+            time.sleep(0.1)
+            continue
+        buffer += data
+        while b'\n' in buffer:
+            frame, buffer = buffer.split(b'\n', 1)
+            frames += 1
+            command = frame.decode(errors='replace')
+            if args.drop_every and frames % args.drop_every == 0:
+                print(f'收到 {command}（不确认）', file=sys.stderr, flush=True)
+                continue
+            print(f'收到 {command}', file=sys.stderr, flush=True)
+            time.sleep(args.ack_delay)
+            if 'P' in command:
+                os.write(master, b'P')
+            elif 'S' in command:
+                os.write(master, b'S')
+
+
+if __name__ == '__main__':
+    main()